@@ -0,0 +1,48 @@
+"""Throughput of the batch API on a whole cohort of random students.
+
+    python benchmarks/bench_batch.py [students]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import examstats  # noqa: E402
+
+
+def best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(students=100_000):
+    exam = list(examstats.load_catalog().values())[-1]
+    rng = np.random.default_rng(0)
+    # half-point scores, so most lookups hit the precomputed tables as real entries would
+    x = np.round(rng.uniform(0.3, 1.0, (students, len(exam.subjects))) * exam.total * 2) / 2
+    cases = {
+        'percentile': lambda: examstats.percentile(exam, x),
+        'group_percentile': lambda: examstats.group_percentile(exam, x),
+        'mean_diff': lambda: examstats.mean_diff(exam, x),
+        'targets': lambda: examstats.targets(exam, x, percentile=90),
+        'report': lambda: examstats.report(exam, x),
+        'sensitivity': lambda: examstats.sensitivity(exam, x),
+    }
+    # warm up NumPy's first-call overheads
+    examstats.percentile(exam, x[:10])
+    print(f'{students} students x {len(exam.subjects)} subjects (best of 3; sensitivity, the slowest, once)')
+    for label, fn in cases.items():
+        seconds = best(fn, 1 if label == 'sensitivity' else 3)
+        print(f'  {label:18} {seconds * 1e3:8.0f} ms  {students / seconds / 1e6:6.2f}M students/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
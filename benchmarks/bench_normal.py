@@ -0,0 +1,53 @@
+"""Per-call latency and import time of examstats.normal against scipy.stats.norm.
+
+    python benchmarks/bench_normal.py
+"""
+import subprocess
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from examstats import normal  # noqa: E402
+
+NUMBER = 20_000
+
+
+def import_time(module):
+    # seconds to import ``module`` in a fresh interpreter, as reported by -X importtime
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         capture_output=True, text=True, cwd=ROOT).stderr
+    line = [line for line in out.splitlines() if line.rstrip().endswith(f'| {module}')][-1]
+    return int(line.split('|')[1]) / 1e6
+
+
+def per_call(fn):
+    return min(timeit.repeat(fn, number=NUMBER, repeat=3)) / NUMBER
+
+
+def main():
+    from scipy.stats import norm
+
+    rng = np.random.default_rng(0)
+    x9, mean9, std9 = rng.uniform(50, 150, 9), rng.uniform(60, 120, 9), rng.uniform(5, 30, 9)
+    grid = np.linspace(0, 150, 400)
+    cases = {
+        'scalar cdf': (lambda: norm.cdf(120.0, 100.0, 15.0), lambda: normal.cdf(120.0, 100.0, 15.0)),
+        '9-subject cdf': (lambda: norm.cdf(x9, mean9, std9), lambda: normal.cdf(x9, mean9, std9)),
+        '9x400 pdf grid': (lambda: norm.pdf(grid, mean9[:, None], std9[:, None]),
+                           lambda: normal.pdf(grid, mean9[:, None], std9[:, None])),
+        '9-subject ppf': (lambda: norm.ppf(0.9, mean9, std9), lambda: normal.ppf(0.9, mean9, std9)),
+    }
+    print(f'per call ({NUMBER} iterations)    scipy.stats.norm   examstats.normal')
+    for label, (old, new) in cases.items():
+        print(f'  {label:24} {per_call(old) * 1e6:12.1f} us {per_call(new) * 1e6:14.1f} us')
+    print('cold import               '
+          f'{import_time("scipy.stats"):12.2f} s  {import_time("examstats.normal"):14.2f} s')
+
+
+if __name__ == '__main__':
+    main()
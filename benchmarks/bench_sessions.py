@@ -0,0 +1,54 @@
+"""Memory held per browser session, with the catalog in every session versus shared by the process.
+
+Before: every session built the whole exam catalog (every exam, subject and group stat block) into
+st.session_state['exams']. After: one compiled catalog per process, and each session keeps only its
+own score vectors. Sessions are simulated as plain dicts standing in for st.session_state.
+
+    python benchmarks/bench_sessions.py [sessions]
+"""
+import copy
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from examstats.catalog import CATALOG_PATH, load_catalog  # noqa: E402
+
+
+def scores(raw):
+    # every session has entered scores for every exam
+    return {name: {sub: 80.0 for sub in spec['subject']} for name, spec in raw.items()}
+
+
+def measure(build, sessions):
+    tracemalloc.start()
+    try:
+        states = [build() for _ in range(sessions)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del states
+    return size
+
+
+def main(sessions=1000):
+    with open(CATALOG_PATH, encoding='utf-8') as f:
+        raw = json.load(f)
+    before = measure(lambda: {'exams': copy.deepcopy(raw), 'scores': scores(raw)}, sessions)
+    tracemalloc.start()
+    catalog = load_catalog()
+    shared = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del catalog
+    after = measure(lambda: {'scores': scores(raw)}, sessions)
+    print(f'{sessions} sessions, {len(raw)} exams')
+    print(f'  catalog per session: {before / sessions / 1024:6.1f} KiB/session, {before / 2**20:6.1f} MiB total')
+    print(f'  shared catalog:      {after / sessions / 1024:6.1f} KiB/session, {after / 2**20:6.1f} MiB total '
+          f'+ {shared / 2**20:.1f} MiB compiled catalog once per process')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,3 @@
+"""北京四中考试成绩分析: exam catalog and batch statistics, importable without Streamlit."""
+from .analysis import group_percentile, group_scores, mean_diff, percentile, report, sensitivity, targets
+from .catalog import CatalogError, CatalogWatcher, Exam, load_catalog
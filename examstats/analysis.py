@@ -0,0 +1,72 @@
+"""Batch statistics for one exam.
+
+Every function takes ``scores`` as an (N students, M subjects) array in ``exam.subjects`` order, a
+single (M,) vector, a score dict or a DataFrame with one column per subject, and returns arrays
+with the same leading shape. Nothing here imports Streamlit or matplotlib.
+"""
+import numpy as np
+import pandas as pd
+
+from .catalog import SCORE_STEP
+
+
+def as_matrix(exam, scores):
+    if isinstance(scores, pd.DataFrame):
+        return scores[list(exam.subjects)].to_numpy(dtype=float)
+    if isinstance(scores, dict):
+        return exam.vector(scores)
+    return np.asarray(scores, dtype=float)
+
+
+def percentile(exam, scores):
+    """Percentile and rank of every subject score."""
+    return exam.percentile(as_matrix(exam, scores))
+
+
+def group_scores(exam, scores):
+    """Score of every group, shape (..., groups)."""
+    return exam.group_scores(as_matrix(exam, scores))
+
+
+def group_percentile(exam, scores):
+    """Percentile and rank of every group, from subject scores."""
+    return exam.group_percentile(group_scores(exam, scores))
+
+
+def mean_diff(exam, scores):
+    """Difference from each subject's mean."""
+    return as_matrix(exam, scores) - exam.mean
+
+
+def sensitivity(exam, scores):
+    """Percentile and rank for every 分数变化 delta, shape (..., deltas, subjects)."""
+    return exam.sensitivity(as_matrix(exam, scores))
+
+
+def targets(exam, scores, percentile=None, rank=None):
+    """Required score and remaining gap for every subject then group, shape (..., subjects + groups).
+
+    Required scores are rounded up to the input step; targets above full marks are NaN.
+    """
+    x = as_matrix(exam, scores)
+    current = np.concatenate([x, exam.group_scores(x)], axis=-1)
+    required = np.concatenate([exam.required(percentile, rank), exam.group_required(percentile, rank)], axis=-1)
+    required = np.maximum(np.ceil(required / SCORE_STEP) * SCORE_STEP, 0)
+    required[required > np.concatenate([exam.total, exam.group_total])] = np.nan
+    return np.broadcast_to(required, current.shape), np.maximum(required - current, 0)
+
+
+def report(exam, scores):
+    """One row per student: every subject and group score with its percentile and rank."""
+    x = np.atleast_2d(as_matrix(exam, scores))
+    sub_pct, sub_rank = exam.percentile(x)
+    grp = exam.group_scores(x)
+    grp_pct, grp_rank = exam.group_percentile(grp)
+    columns = {}
+    for names, values, pct, rank in ((exam.subjects, x, sub_pct, sub_rank), (exam.groups, grp, grp_pct, grp_rank)):
+        for i, name in enumerate(names):
+            columns[name] = values[:, i]
+            columns[f'{name}百分位'] = pct[:, i]
+            columns[f'{name}排名'] = rank[:, i]
+    index = scores.index if isinstance(scores, pd.DataFrame) else None
+    return pd.DataFrame(columns, index=index)
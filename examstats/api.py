@@ -0,0 +1,199 @@
+"""Stateless HTTP JSON API over the exam catalog, stdlib only.
+
+    GET  /exams                         exam names with their subjects and groups
+    POST /percentile  {"exam": ..., "scores": {"语文": 120, ...}}
+    POST /rank        same body; GET with ?exam=...&语文=120&... also works
+
+Concurrent requests are coalesced by a Batcher: requests arriving within a short window are
+stacked into one (N, subjects) array and scored with a single vectorized call per exam.
+"""
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from .catalog import CATALOG_PATH, CatalogWatcher
+
+# extra wait for stragglers before scoring a batch; requests that queue while the previous batch is being
+# scored are coalesced regardless, which on few cores already beats sleeping
+BATCH_WINDOW = 0.0
+MAX_BATCH = 512
+
+
+class Batcher:
+    """Collects (exam, score vector) requests and scores them in batches on one background thread."""
+
+    def __init__(self, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.window, self.max_batch = window, max_batch
+        self.cond = threading.Condition()
+        self.queue = []
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, exam, x):
+        future = Future()
+        with self.cond:
+            self.queue.append((exam, x, future))
+            self.cond.notify()
+        return future.result()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+            # let concurrent requests pile up for one window, unless the batch is already full
+            if self.window and len(self.queue) < self.max_batch:
+                time.sleep(self.window)
+            with self.cond:
+                batch, self.queue = self.queue[:self.max_batch], self.queue[self.max_batch:]
+            by_exam = {}
+            for item in batch:
+                by_exam.setdefault(id(item[0]), []).append(item)
+            for items in by_exam.values():
+                exam = items[0][0]
+                try:
+                    x = np.stack([x for _, x, _ in items])
+                    results = exam.percentile(x) + exam.group_percentile(exam.group_scores(x))
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for i, (_, _, future) in enumerate(items):
+                    future.set_result([r[i] for r in results])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; without this Nagle + delayed ACK adds ~40 ms per request
+    disable_nagle_algorithm = True
+    catalog = None
+    batcher = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/exams':
+            exams = self.catalog.get()
+            return self.reply(200, {name: {'subjects': e.subjects, 'groups': e.groups} for name, e in exams.items()})
+        # http.server decodes the request line as latin-1; undo that for clients sending raw UTF-8
+        query = dict(parse_qsl(url.query.encode('latin-1').decode('utf-8', 'replace')))
+        exam = query.pop('exam', None)
+        self.score(url.path, {'exam': exam, 'scores': query})
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            return self.reply(400, {'error': 'invalid JSON'})
+        if not isinstance(body, dict):
+            return self.reply(400, {'error': 'request body must be a JSON object'})
+        self.score(urlsplit(self.path).path, body)
+
+    def score(self, path, body):
+        if path not in ('/percentile', '/rank'):
+            return self.reply(404, {'error': f'unknown endpoint {path}'})
+        exams = self.catalog.get()
+        name = body.get('exam')
+        if name is not None and not isinstance(name, str):
+            return self.reply(400, {'error': 'exam must be a string'})
+        name = name or list(exams)[-1]
+        if name not in exams:
+            return self.reply(404, {'error': f'unknown exam {name}'})
+        exam = exams[name]
+        scores = body.get('scores') or {}
+        if not isinstance(scores, dict):
+            return self.reply(400, {'error': 'scores must be an object keyed by subject'})
+        try:
+            x = np.array([float(scores[sub]) for sub in exam.subjects])
+        except KeyError as e:
+            return self.reply(400, {'error': f'missing score for {e.args[0]}'})
+        except (TypeError, ValueError):
+            return self.reply(400, {'error': 'scores must be numbers'})
+        # same bounds as roster uploads; NaN would otherwise come back as invalid JSON or a garbage rank
+        bad = ~np.isfinite(x) | (x < 0) | (x > exam.total)
+        if bad.any():
+            return self.reply(400, {'error': f'scores out of range for {", ".join(np.array(exam.subjects)[bad])}'})
+        percentile, rank, group_percentile, group_rank = self.batcher.submit(exam, x)
+        values = (percentile, group_percentile) if path == '/percentile' else (rank, group_rank)
+        self.reply(200, {
+            'exam': name,
+            'subjects': dict(zip(exam.subjects, values[0].tolist())),
+            'groups': dict(zip(exam.groups, values[1].tolist())),
+        })
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections under a burst of concurrent clients
+    request_queue_size = 128
+
+
+def serve(host='127.0.0.1', port=8000, window=BATCH_WINDOW, catalog_path=CATALOG_PATH):
+    handler = type('Handler', (Handler,), {
+        'catalog': CatalogWatcher(catalog_path),
+        'batcher': Batcher(window),
+    })
+    server = Server((host, port), handler)
+    print(f'serving on http://{host}:{port}')
+    server.serve_forever()
+
+
+def load_test(url='http://127.0.0.1:8000', concurrency=32, requests=5000, path='/rank'):
+    """Hammer the API from ``concurrency`` keep-alive clients; returns latency percentiles and throughput."""
+    parts = urlsplit(url)
+    conn = HTTPConnection(parts.hostname, parts.port)
+    conn.request('GET', '/exams')
+    exams = json.loads(conn.getresponse().read())
+    name, exam = list(exams.items())[-1]
+    latencies, errors = [], []
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        conn = HTTPConnection(parts.hostname, parts.port)
+        # the remainder is spread over the first clients, so exactly ``requests`` are sent
+        for _ in range(requests // concurrency + (seed < requests % concurrency)):
+            body = json.dumps({'exam': name, 'scores': {sub: float(rng.integers(60, 100)) for sub in exam['subjects']}})
+            start = time.perf_counter()
+            try:
+                conn.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+            except OSError as e:
+                errors.append(e)
+                conn.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors.append(response.status)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if len(latencies) >= 2:
+        q = statistics.quantiles(latencies, n=100)
+        p50, p99 = q[49], q[98]
+    else:
+        # too few answered requests for quantiles
+        p50 = p99 = latencies[0] if latencies else float('nan')
+    return {'requests': len(latencies), 'errors': len(errors), 'rps': len(latencies) / elapsed,
+            'p50_ms': p50 * 1e3, 'p99_ms': p99 * 1e3}
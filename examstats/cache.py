@@ -0,0 +1,202 @@
+"""Caches of rendered chart bytes.
+
+Charts are keyed on what they are drawn from: exam name and content version, the score vector rounded
+to the input step, the chart kind and its options. Entries are PNG bytes, so a hit costs a dict lookup
+rather than unpickling a figure, and the cache is bounded by total bytes rather than entry count.
+
+ChartCache is per process. DiskCache is an optional second tier in an SQLite file that several
+processes (the replica apps on one host or a shared volume) can use at once, so a chart rendered by
+one replica is a hit for all of them.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .catalog import SCORE_STEP
+
+CHART_CACHE_BYTES = int(float(os.environ.get('EXAMSTATS_CHART_CACHE_MB', 64)) * 2**20)
+# unset: no disk tier
+DISK_CACHE_PATH = os.environ.get('EXAMSTATS_DISK_CACHE')
+DISK_CACHE_BYTES = int(float(os.environ.get('EXAMSTATS_DISK_CACHE_MB', 512)) * 2**20)
+DISK_CACHE_TIMEOUT = 5
+# seconds a disk entry's last-use time may lag behind: a hit only writes it when it is older than this,
+# so reading popular charts does not queue the replicas behind SQLite's single write lock
+DISK_CACHE_TOUCH = 60
+
+logger = logging.getLogger(__name__)
+
+
+def quantize(x):
+    # scores are entered in SCORE_STEP steps; anything finer is noise that would only split the cache
+    return np.round(np.asarray(x, dtype=float) / SCORE_STEP) * SCORE_STEP
+
+
+def freeze_option(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_option(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def chart_key(exam, x, kind, options):
+    # x is None for charts that do not depend on the scores, so every session shares one entry
+    return (exam.name, exam.version, None if x is None else tuple(quantize(x).tolist()), kind,
+            tuple(sorted((k, freeze_option(v)) for k, v in options.items())))
+
+
+class DiskCache:
+    """Size-bounded key/bytes store in an SQLite database, safe to share between processes.
+
+    Each put is one transaction, so readers see a whole entry or none. WAL mode lets readers in other
+    processes proceed while one writes, and a hit writes nothing unless the entry's last use is older
+    than DISK_CACHE_TOUCH. Entries are evicted least recently used first once the total size exceeds
+    ``budget``. Any SQLite error (locked past the timeout, unavailable volume) is logged
+    and treated as a miss: the disk tier can only save work, never fail a render.
+    """
+
+    def __init__(self, path=DISK_CACHE_PATH, budget=DISK_CACHE_BYTES):
+        self.path = path
+        self.budget = budget
+        self.local = threading.local()
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS charts (key TEXT PRIMARY KEY, data BLOB NOT NULL, '
+                       'size INTEGER NOT NULL, used REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS charts_used ON charts (used)')
+
+    def connect(self):
+        # sqlite3 connections must not be shared between threads; Streamlit runs each session on its own
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=DISK_CACHE_TIMEOUT)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        digest = self.digest(key)
+        try:
+            with self.connect() as db:
+                row = db.execute('SELECT data, used FROM charts WHERE key = ?', (digest,)).fetchone()
+                now = time.time()
+                if row is not None and now - row[1] > DISK_CACHE_TOUCH:
+                    db.execute('UPDATE charts SET used = ? WHERE key = ?', (now, digest))
+        except sqlite3.Error as e:
+            logger.warning('disk cache %s unavailable: %s', self.path, e)
+            return None
+        return None if row is None else row[0]
+
+    def put(self, key, data):
+        if len(data) > self.budget:
+            return
+        try:
+            with self.connect() as db:
+                db.execute('INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?)',
+                           (self.digest(key), data, len(data), time.time()))
+                # drop everything past the budget, counting from the most recently used entry
+                db.execute('DELETE FROM charts WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER '
+                           '(ORDER BY used DESC, key) AS total FROM charts) WHERE total > ?)', (self.budget,))
+        except sqlite3.Error as e:
+            logger.warning('disk cache %s unavailable: %s', self.path, e)
+
+    def stats(self):
+        with self.connect() as db:
+            entries, size = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM charts').fetchone()
+        return {'entries': entries, 'bytes': size, 'budget': self.budget}
+
+
+class ChartCache:
+    def __init__(self, budget=CHART_CACHE_BYTES, disk=None):
+        self.budget = budget
+        self.disk = disk
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        # membership only: neither counted as a hit or miss nor refreshed in the LRU order
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.budget:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def chart(self, render, exam, x, kind, **options):
+        """PNG bytes of chart ``kind``, from the cache or from ``render(exam, x, kind, **options)``.
+
+        ``render`` is called with the quantized score vector, so every key maps to exactly one image.
+        Concurrent misses on the same key may both render; the second put just replaces the first.
+        A render that returns None (a skipped prefetch) is passed through and not cached.
+        """
+        key = chart_key(exam, x, kind, options)
+        data = self.get(key)
+        if data is None and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                self.put(key, data)
+        if data is None:
+            data = render(exam, None if x is None else quantize(x), kind, **options)
+            if data is None:
+                return None
+            self.put(key, data)
+            if self.disk is not None:
+                self.disk.put(key, data)
+        return data
+
+    def prerender(self, render, catalog, kinds):
+        # score-independent charts of every exam, so the first session to open them finds them cached
+        for exam in catalog.values():
+            for kind in kinds:
+                try:
+                    self.chart(render, exam, None, kind)
+                except Exception as e:
+                    # a background warm-up: the chart is rendered on demand instead
+                    logger.warning('prerendering %s chart of %s failed: %s', kind, exam.name, e)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def chart_cache(budget=CHART_CACHE_BYTES, disk_path=DISK_CACHE_PATH, disk_budget=DISK_CACHE_BYTES):
+    """ChartCache with the disk tier configured by EXAMSTATS_DISK_CACHE, if any."""
+    disk = None
+    if disk_path:
+        try:
+            disk = DiskCache(disk_path, disk_budget)
+        except sqlite3.Error as e:
+            logger.warning('disk cache %s unavailable, using memory only: %s', disk_path, e)
+    return ChartCache(budget, disk)
@@ -0,0 +1,449 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+
+import numpy as np
+
+from . import normal
+
+SUBJECT_FIELDS = ('total', 'max', 'median', 'mean', 'std', 'count')
+GROUP_FIELDS = ('max', 'median', 'mean', 'std', 'count')
+
+# scores are entered in half-point steps; curves are sampled on a fixed number of points over [0, total]
+SCORE_STEP = 0.5
+CURVE_POINTS = 400
+# the 分数变化 slider moves every subject by -SENSITIVITY_RANGE..SENSITIVITY_RANGE points
+SENSITIVITY_RANGE = 20
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = Path(os.environ.get('EXAMSTATS_CATALOG', Path(__file__).with_name('exams.json')))
+
+
+class CatalogError(ValueError):
+    pass
+
+
+def freeze(obj):
+    # recursively turn dicts and lists into read-only views so the shared catalog cannot be mutated by a session
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def readonly(values, dtype=float):
+    arr = np.array(values, dtype=dtype)
+    arr.flags.writeable = False
+    return arr
+
+
+@dataclass(frozen=True, eq=False)
+class Exam:
+    """One exam compiled into arrays aligned by subject (and group) order."""
+    name: str
+    version: str
+    spec: MappingProxyType
+    subjects: tuple
+    total: np.ndarray
+    max: np.ndarray
+    median: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    count: np.ndarray
+    groups: tuple
+    # subjects x groups; column j holds each subject's weight in group j (0 when not included)
+    group_weights: np.ndarray
+    group_total: np.ndarray
+    # subjects x subjects correlation used for sampling custom subject combinations
+    correlation: np.ndarray
+    group_max: np.ndarray
+    group_median: np.ndarray
+    group_mean: np.ndarray
+    group_std: np.ndarray
+    group_count: np.ndarray
+    # official score-band tables, (scores, above) per subject/group or None when not published
+    bands: tuple
+    group_bands: tuple
+    # lookup tables built at load time, one row per subject/group
+    curve_x: np.ndarray
+    curve_y: np.ndarray
+    percentile_table: np.ndarray
+    rank_table: np.ndarray
+    group_curve_x: np.ndarray
+    group_curve_y: np.ndarray
+    group_percentile_table: np.ndarray
+    group_rank_table: np.ndarray
+
+    def vector(self, scores):
+        # score dict -> array in subject order
+        return np.array([scores[sub] for sub in self.subjects], dtype=float)
+
+    def group_scores(self, x):
+        """Group scores for subject scores ``x`` (shape (..., subjects)), shape (..., groups)."""
+        return np.asarray(x, dtype=float) @ self.group_weights
+
+    def percentile(self, x):
+        """Percentile and rank of each subject score in ``x`` (shape (..., subjects))."""
+        return lookup(x, self.percentile_table, self.rank_table, self.mean, self.std, self.count, self.bands)
+
+    def group_percentile(self, x):
+        """Percentile and rank of each group score in ``x`` (shape (..., groups))."""
+        return lookup(
+            x, self.group_percentile_table, self.group_rank_table,
+            self.group_mean, self.group_std, self.group_count, self.group_bands)
+
+    def required(self, percentile=None, rank=None):
+        """Score each subject needs to reach a target percentile or rank, shape (..., subjects)."""
+        return model_score(percentile, rank, self.mean, self.std, self.count, self.bands)
+
+    def group_required(self, percentile=None, rank=None):
+        """Score each group needs to reach a target percentile or rank, shape (..., groups)."""
+        return model_score(percentile, rank, self.group_mean, self.group_std, self.group_count, self.group_bands)
+
+    def sensitivity(self, x):
+        """Percentile and rank of every subject for each slider delta, shape (..., deltas, subjects)."""
+        deltas = np.arange(-SENSITIVITY_RANGE, SENSITIVITY_RANGE + 1)
+        return self.percentile(np.asarray(x, dtype=float)[..., None, :] + deltas[:, None])
+
+
+def normal_percentile(x, mean, std, count):
+    percentile = normal.cdf(x, mean, std) * 100
+    return percentile, ((100 - percentile) / 100 * count).astype(int)
+
+
+def compile_bands(bands):
+    # [[score, students at or above score], ...] -> ascending scores and students strictly above each score
+    if not bands:
+        return None
+    bands = sorted(bands)
+    scores = readonly([b[0] for b in bands])
+    above = readonly([b[1] for b in bands[1:]] + [0], int)
+    return scores, above, int(bands[0][1])
+
+
+def band_percentile(x, scores, above, count):
+    # students strictly above x: the cumulative count of the next listed score above x
+    rank = np.concatenate([[count], above])[np.searchsorted(scores, x, side='right')]
+    return (count - rank) / count * 100, rank
+
+
+def model_percentile_at(x, cols, mean, std, count, bands):
+    # flat scores x for subject/group columns cols; columns with a published score-band table use it,
+    # the rest the normal model
+    percentile, rank = normal_percentile(x, mean[cols], std[cols], count[cols])
+    for i, band in enumerate(bands):
+        if band is not None:
+            at = cols == i
+            percentile[at], rank[at] = band_percentile(x[at], *band)
+    return percentile, rank
+
+
+def model_percentile(x, mean, std, count, bands):
+    # x has one column per subject/group
+    shape = np.broadcast_shapes(np.shape(x), mean.shape)
+    cols = np.broadcast_to(np.arange(len(mean)), shape).ravel()
+    percentile, rank = model_percentile_at(
+        np.broadcast_to(np.asarray(x, dtype=float), shape).ravel(), cols, mean, std, count, bands)
+    return percentile.reshape(shape), rank.reshape(shape)
+
+
+# slack for a rank computed from a percentile, which can come out a hair above a whole number of students
+RANK_TOLERANCE = 1e-6
+
+
+def band_score(rank, scores, above):
+    # lowest listed score with at most the target number of students strictly above it
+    return scores[np.searchsorted(-above, -(rank + RANK_TOLERANCE), side='left')]
+
+
+def model_score(percentile, rank, mean, std, count, bands):
+    # inverse of model_percentile for a target percentile or rank (students ahead), one column per
+    # subject/group. A target rank goes to a band table as given rather than through a percentile and back
+    if rank is not None:
+        rank = np.maximum(np.asarray(rank, dtype=float), 0)
+        percentile = 100 * (1 - rank / count)
+    percentile = np.clip(np.asarray(percentile, dtype=float), 0, 100)
+    score = normal.ppf(percentile / 100, mean, std)
+    for i, band in enumerate(bands):
+        if band is not None:
+            scores, above, band_count = band
+            target = rank if rank is not None else (100 - percentile) / 100 * band_count
+            score[..., i] = band_score(np.broadcast_to(target, score.shape)[..., i], scores, above)
+    return score
+
+
+def build_tables(total, mean, std, count, bands):
+    # pdf curves on CURVE_POINTS points, and percentile/rank for every half-point score up to total
+    curve_x = np.linspace(0, total, CURVE_POINTS, axis=-1)
+    curve_y = normal.pdf(curve_x, mean[:, None], std[:, None])
+    steps = np.arange(int(np.ceil(total.max(initial=0) / SCORE_STEP)) + 1) * SCORE_STEP
+    percentiles, ranks = model_percentile(steps[:, None], mean, std, count, bands)
+    return [readonly(a, a.dtype) for a in (curve_x, curve_y, percentiles.T, ranks.T)]
+
+
+def lookup(x, percentiles, ranks, mean, std, count, bands):
+    x = np.asarray(x, dtype=float)
+    steps = x / SCORE_STEP
+    idx = np.rint(steps).astype(int)
+    rows, width = np.arange(percentiles.shape[0]), percentiles.shape[1]
+    on_grid = (idx == steps) & (idx >= 0) & (idx < width)
+    # flat indices into the tables; np.take is much faster than 2-D fancy indexing on large batches
+    flat = np.where(on_grid, idx, 0) + rows * width
+    percentile, rank = percentiles.take(flat), ranks.take(flat)
+    if on_grid.all():
+        return percentile, rank
+    # off-grid scores (e.g. scaled group totals, or beyond the table) are computed directly
+    off = ~on_grid
+    percentile[off], rank[off] = model_percentile_at(
+        x[off], np.broadcast_to(rows, x.shape)[off], mean, std, count, bands)
+    return percentile, rank
+
+
+def is_number(value):
+    # JSON numbers only: bool is an int subclass, and a quoted "7.88" would fail the range checks with a TypeError
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and bool(np.isfinite(value))
+
+
+def validate_fields(label, stats, fields, errors):
+    # types first, so the range checks that follow only ever compare numbers
+    if not isinstance(stats, dict):
+        errors.append(f'{label}: expected an object of statistics, got {type(stats).__name__}')
+        return False
+    missing = [f for f in fields if f not in stats]
+    if missing:
+        errors.append(f'{label}: missing {", ".join(missing)}')
+        return False
+    not_numbers = [f for f in fields if not is_number(stats[f])]
+    if not_numbers:
+        errors.append(f'{label}: non-numeric {", ".join(not_numbers)}')
+        return False
+    return True
+
+
+def validate_bands(label, bands, errors):
+    if not bands:
+        return
+    if not isinstance(bands, list) or any(
+            not isinstance(b, list) or len(b) != 2 or not all(map(is_number, b)) for b in bands):
+        errors.append(f'{label}: bands must be [score, cumulative count] pairs')
+        return
+    bands = sorted(bands)
+    scores = [b[0] for b in bands]
+    counts = [b[1] for b in bands]
+    if len(set(scores)) != len(scores):
+        errors.append(f'{label}: duplicate scores in bands')
+    if any(c < 0 or int(c) != c for c in counts):
+        errors.append(f'{label}: band counts must be non-negative integers')
+    if any(a < b for a, b in zip(counts, counts[1:])):
+        errors.append(f'{label}: band counts must not increase with score')
+    if counts[0] <= 0:
+        errors.append(f'{label}: bands cover no students')
+
+
+def validate_exam(name, spec):
+    if not isinstance(spec, dict):
+        raise CatalogError(f'{name}: expected an object, got {type(spec).__name__}')
+    errors = []
+    subjects = spec.get('subject') or {}
+    groups = spec.get('group') or {}
+    if not isinstance(subjects, dict) or not isinstance(groups, dict):
+        raise CatalogError(f'{name}: subject and group must be objects keyed by name')
+    if not subjects:
+        errors.append('no subjects')
+    # subjects whose fields are well-typed, so group totals can be computed from them
+    typed = set()
+    for sub, stats in subjects.items():
+        if not validate_fields(sub, stats, SUBJECT_FIELDS, errors):
+            continue
+        typed.add(sub)
+        if stats['total'] <= 0:
+            errors.append(f'{sub}: total must be positive')
+        if not 0 <= stats['max'] <= stats['total']:
+            errors.append(f'{sub}: max {stats["max"]} outside [0, {stats["total"]}]')
+        if not 0 <= stats['median'] <= stats['max']:
+            errors.append(f'{sub}: median {stats["median"]} outside [0, {stats["max"]}]')
+        if not 0 <= stats['mean'] <= stats['max']:
+            errors.append(f'{sub}: mean {stats["mean"]} outside [0, {stats["max"]}]')
+        if stats['std'] <= 0:
+            errors.append(f'{sub}: std must be positive')
+        if stats['count'] <= 0 or int(stats['count']) != stats['count']:
+            errors.append(f'{sub}: count must be a positive integer')
+        validate_bands(sub, stats.get('bands'), errors)
+    for grp, stats in groups.items():
+        if not validate_fields(grp, stats, GROUP_FIELDS, errors):
+            continue
+        if not isinstance(stats.get('include'), list) or not all(isinstance(sub, str) for sub in stats['include']):
+            errors.append(f'{grp}: include must be a list of subject names')
+            continue
+        if len(set(stats['include'])) != len(stats['include']):
+            # compile_exam sets one weight per subject, so a repeat would silently count once
+            errors.append(f'{grp}: duplicate subjects in include')
+            continue
+        unknown = [sub for sub in stats['include'] if sub not in subjects]
+        if unknown:
+            errors.append(f'{grp}: unknown subjects {", ".join(unknown)}')
+            continue
+        if not typed.issuperset(stats['include']):
+            # the subject's own error is already reported
+            continue
+        scale = stats.get('scale', [1] * len(stats['include']))
+        if not isinstance(scale, list) or not all(map(is_number, scale)):
+            errors.append(f'{grp}: scale must be a list of numbers')
+            continue
+        if len(scale) != len(stats['include']):
+            errors.append(f'{grp}: scale has {len(scale)} entries for {len(stats["include"])} subjects')
+            continue
+        total = sum(subjects[sub]['total'] * s for sub, s in zip(stats['include'], scale))
+        if not 0 <= stats['max'] <= total + 1e-6:
+            errors.append(f'{grp}: max {stats["max"]} outside [0, {total:g}]')
+        if not 0 <= stats['median'] <= stats['max']:
+            errors.append(f'{grp}: median {stats["median"]} outside [0, {stats["max"]}]')
+        if not 0 <= stats['mean'] <= stats['max']:
+            errors.append(f'{grp}: mean {stats["mean"]} outside [0, {stats["max"]}]')
+        if stats['std'] <= 0:
+            errors.append(f'{grp}: std must be positive')
+        if stats['count'] <= 0 or int(stats['count']) != stats['count']:
+            errors.append(f'{grp}: count must be a positive integer')
+        validate_bands(grp, stats.get('bands'), errors)
+    corr = spec.get('correlation')
+    if corr is not None:
+        if is_number(corr):
+            if not 0 <= corr < 1:
+                errors.append(f'correlation {corr} outside [0, 1)')
+        elif not isinstance(corr, list) or len(corr) != len(subjects) or not all(
+                isinstance(row, list) and len(row) == len(subjects) and all(map(is_number, row)) for row in corr):
+            errors.append(f'correlation must be a number or a {len(subjects)}x{len(subjects)} matrix')
+        else:
+            corr = np.array(corr, dtype=float)
+            if not np.allclose(corr, corr.T) or not np.allclose(np.diag(corr), 1):
+                errors.append('correlation matrix must be symmetric with a unit diagonal')
+            elif np.linalg.eigvalsh(corr).min() <= 0:
+                errors.append('correlation matrix must be positive definite')
+    if errors:
+        raise CatalogError(f'{name}: ' + '; '.join(errors))
+
+
+def spec_version(spec):
+    # content hash of one exam, so caches keyed on it survive reloads that leave the exam untouched
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:12]
+
+
+def fit_correlation(std, weights, group_std):
+    # one common correlation between subjects that best explains the reported group stds:
+    # var(group) = sum(w^2 s^2) + rho * ((w.s)^2 - sum(w^2 s^2))
+    ws = weights * std[:, None]
+    independent = (ws ** 2).sum(axis=0)
+    cross = ws.sum(axis=0) ** 2 - independent
+    usable = cross > 0
+    if not usable.any():
+        return 0.0
+    rho = (group_std[usable] ** 2 - independent[usable]) / cross[usable]
+    return float(np.clip(rho.mean(), 0, 0.9))
+
+
+def compile_correlation(corr, std, weights, group_std):
+    if corr is None:
+        corr = fit_correlation(std, weights, group_std)
+    if np.ndim(corr) == 0:
+        return readonly(np.full((len(std), len(std)), corr) + (1 - corr) * np.eye(len(std)))
+    return readonly(corr)
+
+
+def compile_exam(name, spec, version=None):
+    validate_exam(name, spec)
+    subjects = tuple(spec['subject'])
+    groups = tuple(spec.get('group', {}))
+    sub_stats = [spec['subject'][sub] for sub in subjects]
+    grp_stats = [spec['group'][grp] for grp in groups]
+    weights = np.zeros((len(subjects), len(groups)))
+    for j, stats in enumerate(grp_stats):
+        scale = stats.get('scale', [1] * len(stats['include']))
+        for sub, s in zip(stats['include'], scale):
+            weights[subjects.index(sub), j] = s
+    columns = {f: readonly([s[f] for s in sub_stats], int if f == 'count' else float) for f in SUBJECT_FIELDS}
+    group_columns = {f'group_{f}': readonly([s[f] for s in grp_stats], int if f == 'count' else float) for f in GROUP_FIELDS}
+    group_columns['group_weights'] = readonly(weights)
+    group_columns['group_total'] = readonly(columns['total'] @ weights)
+    correlation = compile_correlation(spec.get('correlation'), columns['std'], weights, group_columns['group_std'])
+    bands = tuple(compile_bands(s.get('bands')) for s in sub_stats)
+    group_bands = tuple(compile_bands(s.get('bands')) for s in grp_stats)
+    curve_x, curve_y, percentile_table, rank_table = build_tables(
+        columns['total'], columns['mean'], columns['std'], columns['count'], bands)
+    group_curve_x, group_curve_y, group_percentile_table, group_rank_table = build_tables(
+        group_columns['group_total'], group_columns['group_mean'], group_columns['group_std'],
+        group_columns['group_count'], group_bands)
+    return Exam(
+        name=name,
+        version=version or spec_version(spec),
+        spec=freeze(spec),
+        subjects=subjects,
+        groups=groups,
+        **columns,
+        **group_columns,
+        correlation=correlation,
+        bands=bands,
+        group_bands=group_bands,
+        curve_x=curve_x,
+        curve_y=curve_y,
+        percentile_table=percentile_table,
+        rank_table=rank_table,
+        group_curve_x=group_curve_x,
+        group_curve_y=group_curve_y,
+        group_percentile_table=group_percentile_table,
+        group_rank_table=group_rank_table,
+    )
+
+
+def compile_catalog(raw, previous=None):
+    # reuse the compiled Exam (and everything derived from it) for exams whose content did not change
+    if not isinstance(raw, dict):
+        raise CatalogError(f'expected an object keyed by exam name, got {type(raw).__name__}')
+    previous = previous or {}
+    exams = {}
+    for name, spec in raw.items():
+        version = spec_version(spec)
+        old = previous.get(name)
+        exams[name] = old if old is not None and old.version == version else compile_exam(name, spec, version)
+    return MappingProxyType(exams)
+
+
+def load_catalog(path=CATALOG_PATH, previous=None):
+    with open(path, encoding='utf-8') as f:
+        return compile_catalog(json.load(f), previous)
+
+
+class CatalogWatcher:
+    """Process-wide catalog that reloads itself when the data file's mtime changes."""
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.mtime = self.path.stat().st_mtime_ns
+        self.exams = load_catalog(self.path)
+
+    def get(self):
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError as e:
+            logger.warning('catalog %s unavailable, keeping previous version: %s', self.path, e)
+            return self.exams
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    try:
+                        # build the new mapping completely, then swap the reference in one assignment
+                        self.exams = load_catalog(self.path, self.exams)
+                    except Exception as e:
+                        # anything short of a complete new catalog (unreadable file, bad JSON, a spec that
+                        # slipped past validation) keeps serving the previous one; mtime is still recorded
+                        # below, so the broken file is reported once rather than on every call
+                        logger.warning('failed to reload catalog %s, keeping previous version: %s', self.path, e)
+                    self.mtime = mtime
+        return self.exams
@@ -0,0 +1,148 @@
+"""Command-line batch mode: ``python -m examstats rank roster.csv -o ranks.parquet``.
+
+Streams a roster through the same statistics as the viewer, chunk by chunk. With ``--workers`` the
+chunks are scored (and, for CSV, serialized) in a process pool. Streamlit and matplotlib are never
+imported. ``serve`` and ``loadtest`` run and exercise the HTTP API in api.py.
+"""
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from . import analysis, roster
+from .catalog import CATALOG_PATH, load_catalog
+
+# set in each pool worker by init_worker
+worker_exam = None
+
+
+def init_worker(catalog_path, exam):
+    global worker_exam
+    worker_exam = load_catalog(catalog_path)[exam]
+
+
+def score_chunk(ids, scores, fmt, header, exam=None):
+    import pandas as pd
+    report = pd.concat([ids, analysis.report(exam or worker_exam, scores)], axis=1)
+    return report.to_csv(index=False, header=header) if fmt == 'csv' else report
+
+
+class Writer:
+    def __init__(self, path, fmt):
+        self.path, self.fmt = path, fmt
+        self.file = self.parquet = None
+
+    def write(self, part):
+        if self.fmt == 'csv':
+            if self.file is None:
+                self.file = sys.stdout if self.path == '-' else open(self.path, 'w', encoding='utf-8', newline='')
+            self.file.write(part)
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        if self.parquet is None:
+            self.parquet = pq.ParquetWriter(self.path, table.schema)
+        self.parquet.write_table(table)
+
+    def close(self):
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+        if self.parquet is not None:
+            self.parquet.close()
+
+
+def rank(args):
+    exams = load_catalog(args.catalog)
+    name = args.exam or list(exams)[-1]
+    if name not in exams:
+        sys.exit(f'未知考试: {name}')
+    exam = exams[name]
+    fmt = args.format or ('parquet' if str(args.output).endswith('.parquet') else 'csv')
+    if fmt == 'parquet':
+        if args.output == '-':
+            sys.exit('parquet 输出需要指定文件路径')
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit('parquet 输出需要安装 pyarrow')
+    writer = Writer(args.output, fmt)
+    chunks = roster.read_roster(exam, args.input, args.chunksize)
+    try:
+        if args.workers <= 1:
+            for i, (ids, scores) in enumerate(chunks):
+                writer.write(score_chunk(ids, scores, fmt, i == 0, exam))
+            return
+        with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(args.catalog, name)) as pool:
+            # keep a bounded window of chunks in flight so memory does not grow with the input
+            pending = deque()
+            for i, (ids, scores) in enumerate(chunks):
+                pending.append(pool.submit(score_chunk, ids, scores, fmt, i == 0))
+                if len(pending) >= 2 * args.workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        writer.close()
+
+
+def serve(args):
+    from .api import serve
+    serve(args.host, args.port, args.window, args.catalog)
+
+
+def load_test(args):
+    from .api import load_test
+    result = load_test(args.url, args.concurrency, args.requests, args.path)
+    print(f'{result["requests"]} 请求, {result["errors"]} 错误, {result["rps"]:.0f} 请求/秒, '
+          f'p50 {result["p50_ms"]:.2f} ms, p99 {result["p99_ms"]:.2f} ms')
+
+
+def list_exams(args):
+    for name in load_catalog(args.catalog):
+        print(name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m examstats', description='北京四中考试成绩分析')
+    parser.add_argument('--catalog', type=Path, default=CATALOG_PATH, help='考试数据文件 (默认 %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('exams', help='列出考试')
+    p.set_defaults(func=list_exams)
+
+    p = commands.add_parser('rank', help='计算全班成绩的百分位和排名')
+    p.add_argument('input', help='成绩 CSV，每行一名学生，每科一列')
+    p.add_argument('-o', '--output', default='-', help='输出文件 (.csv 或 .parquet)，默认输出 CSV 到标准输出')
+    p.add_argument('-e', '--exam', help='考试名称，默认最近一次考试')
+    p.add_argument('-f', '--format', choices=['csv', 'parquet'], help='输出格式，默认按文件扩展名判断')
+    p.add_argument('--chunksize', type=int, default=roster.ROSTER_CHUNK, help='每批读取的行数 (默认 %(default)s)')
+    p.add_argument('-j', '--workers', type=int, default=1, help='并行进程数 (默认 %(default)s)')
+    p.set_defaults(func=rank)
+
+    p = commands.add_parser('serve', help='启动 HTTP JSON 接口')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    p.add_argument('--window', type=float, default=0.0, help='合并请求前额外等待的时间，秒 (默认 %(default)s)')
+    p.set_defaults(func=serve)
+
+    p = commands.add_parser('loadtest', help='对 HTTP 接口进行压力测试')
+    p.add_argument('--url', default='http://127.0.0.1:8000')
+    p.add_argument('-c', '--concurrency', type=int, default=32)
+    p.add_argument('-n', '--requests', type=int, default=5000)
+    p.add_argument('--path', default='/rank', choices=['/rank', '/percentile'])
+    p.set_defaults(func=load_test)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader of stdout went away (``| head``): stop without a traceback. stdout is pointed at devnull
+        # so that flushing it again at interpreter exit does not fail too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
@@ -0,0 +1,30 @@
+"""Normal distribution kernel for the hot path.
+
+scipy.stats.norm goes through the generic rv_continuous machinery on every call and pulls in all of
+scipy.stats at import time; these work on plain floats or NumPy arrays with broadcasting.
+"""
+import math
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+Scalar = (int, float)
+
+
+def cdf(x, mean=0.0, std=1.0):
+    if isinstance(x, Scalar) and isinstance(mean, Scalar) and isinstance(std, Scalar):
+        return 0.5 * math.erfc((mean - x) / (std * math.sqrt(2)))
+    return ndtr((np.asarray(x, dtype=float) - mean) / std)
+
+
+def pdf(x, mean=0.0, std=1.0):
+    if isinstance(x, Scalar) and isinstance(mean, Scalar) and isinstance(std, Scalar):
+        z = (x - mean) / std
+        return math.exp(-0.5 * z * z) * INV_SQRT_2PI / std
+    z = (np.asarray(x, dtype=float) - mean) / std
+    return np.exp(-0.5 * z * z) * (INV_SQRT_2PI / np.asarray(std, dtype=float))
+
+
+def ppf(q, mean=0.0, std=1.0):
+    return mean + std * ndtri(np.asarray(q, dtype=float))
@@ -0,0 +1,173 @@
+"""Chart rendering off the Streamlit script thread.
+
+Agg rendering is CPU-bound and holds the GIL, so rendering on a session's script thread stalls every
+other session on the replica. RenderPool keeps warm worker processes that have already imported
+matplotlib, loaded the CJK font and the catalog; a request carries only (exam name, score vector,
+chart kind, options) and gets PNG bytes back.
+"""
+import logging
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import get_context
+
+from .catalog import CATALOG_PATH, CatalogWatcher
+
+RENDER_WORKERS = int(os.environ.get('EXAMSTATS_RENDER_WORKERS', 2))
+# requests allowed to wait for a worker on top of the ones being rendered
+RENDER_QUEUE = int(os.environ.get('EXAMSTATS_RENDER_QUEUE', 16))
+# seconds to wait for a worker's render; a worker that takes longer is taken to be hung
+RENDER_TIMEOUT = 30
+# renders waiting for a worker at which the pool counts as overloaded and the viewer falls back to lite mode
+LITE_QUEUE = int(os.environ.get('EXAMSTATS_LITE_QUEUE', 4))
+
+# chart kinds that depend on the exam only, rendered with x=None; kept here rather than in charts so the
+# viewer can use it without importing matplotlib
+STATIC_CHARTS = frozenset({'all'})
+
+# set in each worker by init_worker
+catalog = None
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(RuntimeError):
+    pass
+
+
+class StaleCatalog(RuntimeError):
+    """The worker's catalog is not the version the request was made against."""
+
+
+def init_worker(catalog_path):
+    global catalog
+    from . import charts
+    catalog = CatalogWatcher(catalog_path)
+    # draw once so the font cache and the Agg backend are loaded before the first real request, and
+    # build the grid backgrounds of the newest exam, which the viewer selects by default
+    exam = list(catalog.get().values())[-1]
+    charts.render_png(exam, None, 'all')
+    for kind in charts.GRIDS:
+        charts.grid_background(exam, kind)
+
+
+def render_in_worker(name, version, x, kind, options):
+    from . import charts
+    exam = catalog.get().get(name)
+    if exam is None or exam.version != version:
+        raise StaleCatalog(f'{name}: worker has catalog version {exam and exam.version}, expected {version}')
+    return charts.render_png(exam, x, kind, **options)
+
+
+def ready():
+    return True
+
+
+def render_here(exam, x, kind, options):
+    # in this process, when no worker can take the request: drawn whole, so the server process does
+    # not build and keep grid backgrounds of its own
+    from . import charts
+    return charts.draw_png(exam, x, kind, **options)
+
+
+@contextmanager
+def detached_main():
+    # spawned children re-import the parent's __main__, which under Streamlit is the app script itself;
+    # show them an empty module while the workers start
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+class RenderPool:
+    def __init__(self, workers=RENDER_WORKERS, queue=RENDER_QUEUE, catalog_path=CATALOG_PATH):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        # renders submitted and not finished, to tell when prefetching would delay someone
+        self.busy = 0
+        self.lock = threading.Lock()
+        self.catalog_path = catalog_path
+        self.pool = None
+        # one warm-up task per worker; not waited for here, so a new server process answers with lite
+        # pages (see overloaded) instead of holding its first sessions until the workers are up
+        self.starting = []
+        if workers > 0:
+            self.start()
+
+    def start(self):
+        # spawn rather than fork: the Streamlit server process is multi-threaded
+        self.pool = ProcessPoolExecutor(
+            self.workers, mp_context=get_context('spawn'), initializer=init_worker, initargs=(self.catalog_path,))
+        # processes start on submit, so submitting one task per worker starts (and warms) all of them now
+        with detached_main():
+            self.starting = [self.pool.submit(ready) for _ in range(self.workers)]
+
+    def restart(self, old, reason):
+        # a worker that dies (OOM kill, segfault) takes the whole executor with it, and a hung one keeps its
+        # slot in it for good; replace it once, however many renders saw it fail
+        with self.lock:
+            if self.pool is not old:
+                return
+            logger.warning('%s, restarting %d render workers', reason, self.workers)
+            # shutdown forgets the processes, and does not stop one that is still running a task
+            processes = list(old._processes.values()) if old._processes else []
+            old.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            self.start()
+
+    def render(self, exam, x, kind, **options):
+        """PNG bytes of chart ``kind`` for ``exam`` and score vector ``x``."""
+        if self.pool is None:
+            from . import charts
+            return charts.render_png(exam, x, kind, **options)
+        # not blocking: past the queue a session gets the busy message at once rather than after a wait
+        if not self.slots.acquire(blocking=False):
+            raise RenderQueueFull(f'{self.workers} render workers busy')
+        with self.lock:
+            self.busy += 1
+        pool = self.pool
+        try:
+            x = None if x is None else list(map(float, x))
+            future = pool.submit(render_in_worker, exam.name, exam.version, x, kind, options)
+            return future.result(timeout=RENDER_TIMEOUT)
+        except StaleCatalog:
+            # the catalog file changed between this process and the worker reading it
+            return render_here(exam, x, kind, options)
+        except BrokenProcessPool:
+            self.restart(pool, 'render worker died')
+            return render_here(exam, x, kind, options)
+        except TimeoutError:
+            # rendering it again here would stall every session on the script thread's GIL; the hung worker
+            # is replaced and this session shows the busy message
+            self.restart(pool, f'{kind} chart of {exam.name} not rendered within {RENDER_TIMEOUT} s')
+            raise RenderQueueFull(f'{kind} chart of {exam.name} timed out') from None
+        finally:
+            with self.lock:
+                self.busy -= 1
+            self.slots.release()
+
+    def prefetch(self, exam, x, kind, **options):
+        """Like render, but only while a worker is idle; returns None instead of queueing."""
+        with self.lock:
+            if self.busy >= max(1, self.workers):
+                return None
+        return self.render(exam, x, kind, **options)
+
+    def overloaded(self, queue=LITE_QUEUE):
+        """True while the workers are starting or at least ``queue`` renders are waiting for one."""
+        if not all(future.done() for future in self.starting):
+            return True
+        with self.lock:
+            return self.busy - self.workers >= queue
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,66 @@
+"""Whole-class rosters: one student per CSV row, one column per subject.
+
+Files are parsed in chunks straight into float arrays, so a grade-sized upload is never held as
+Python dicts. Columns that are not subjects (姓名, 学号, ...) are carried through unchanged.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from . import analysis
+
+ROSTER_CHUNK = 10_000
+
+
+def read_roster(exam, source, chunksize=ROSTER_CHUNK):
+    """Yield ``(ids, scores)`` per chunk: the non-subject columns and an (n, subjects) float array."""
+    subjects = list(exam.subjects)
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        missing = [sub for sub in subjects if sub not in chunk.columns]
+        if missing:
+            raise ValueError(f'缺少科目列: {", ".join(missing)}')
+        scores = chunk[subjects].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        bad = np.isnan(scores).any(axis=1) | (scores < 0).any(axis=1) | (scores > exam.total).any(axis=1)
+        if bad.any():
+            rows = ', '.join(str(i + 2) for i in chunk.index[bad][:10])
+            raise ValueError(f'第 {rows} 行成绩缺失或超出范围')
+        yield chunk.drop(columns=subjects).reset_index(drop=True), scores
+
+
+def parse_row(exam, text):
+    """Scores of one student pasted as a single row (e.g. copied from a spreadsheet), in subject order."""
+    values = [v for v in re.split(r'[\s,，;；、]+', text.strip()) if v]
+    if len(values) != len(exam.subjects):
+        raise ValueError(f'需要 {len(exam.subjects)} 科成绩（{"、".join(exam.subjects)}），实际为 {len(values)} 个')
+    try:
+        scores = np.array(values, dtype=float)
+    except ValueError:
+        raise ValueError('成绩中包含非数字内容') from None
+    bad = np.isnan(scores) | (scores < 0) | (scores > exam.total)
+    if bad.any():
+        raise ValueError(f'{"、".join(np.array(exam.subjects)[bad])} 成绩超出范围')
+    return dict(zip(exam.subjects, scores.tolist()))
+
+
+def roster_report(exam, source, chunksize=ROSTER_CHUNK):
+    """Per-student table: identifying columns followed by analysis.report for every chunk."""
+    parts = [pd.concat([ids, analysis.report(exam, scores)], axis=1) for ids, scores in read_roster(exam, source, chunksize)]
+    return pd.concat(parts, ignore_index=True) if parts else analysis.report(exam, np.empty((0, len(exam.subjects))))
+
+
+def summarize(exam, report):
+    """Grade-level summary of a roster report, one row per subject and group."""
+    names = list(exam.subjects + exam.groups)
+    scores = report[names]
+    summary = pd.DataFrame({
+        '人数': scores.count(),
+        '平均分': scores.mean(),
+        '标准差': scores.std(),
+        '中位数': scores.median(),
+        '最高分': scores.max(),
+        '最低分': scores.min(),
+    })
+    summary['年级平均分'] = np.concatenate([exam.mean, exam.group_mean])
+    summary['平均百分位'] = report[[f'{name}百分位' for name in names]].mean().to_numpy()
+    return summary
@@ -0,0 +1,63 @@
+"""What the charts show, as small tables, for the viewer's lite mode.
+
+Every function returns a DataFrame built from the catalog's lookup tables, without matplotlib, so a
+lite rerun costs table lookups rather than a render. Distribution curves are cut down to
+SPARKLINE_POINTS values per row, for the browser to draw as sparklines inside the table.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from . import analysis
+
+SPARKLINE_POINTS = 40
+
+
+@lru_cache(maxsize=16)
+def sparklines(exam, groups=False):
+    # the curves the distribution charts draw, over [0, total], on few enough points for a table cell
+    curve_y = exam.group_curve_y if groups else exam.curve_y
+    step = max(1, curve_y.shape[-1] // SPARKLINE_POINTS)
+    return tuple(row[::step].round(5).tolist() for row in curve_y)
+
+
+def distribution_table(exam, x, groups=False):
+    """Score, percentile and rank against each subject's (or group's) distribution, one row per chart panel."""
+    if groups:
+        names, score, (percentile, rank) = exam.groups, analysis.group_scores(exam, x), analysis.group_percentile(exam, x)
+        total, mean, max_ = exam.group_total, exam.group_mean, exam.group_max
+    else:
+        names, score, (percentile, rank) = exam.subjects, analysis.as_matrix(exam, x), analysis.percentile(exam, x)
+        total, mean, max_ = exam.total, exam.mean, exam.max
+    return pd.DataFrame({
+        '成绩': score,
+        '百分位': percentile.round(1),
+        '排名': rank,
+        '平均分': mean.round(1),
+        '最高分': max_,
+        '满分': total,
+        '成绩分布': list(sparklines(exam, groups)),
+    }, index=list(names))
+
+
+def waterfall_table(exam, x, sort=False):
+    """Each subject's difference from its mean and the running total, in waterfall chart order."""
+    diffs = analysis.mean_diff(exam, x)
+    subjects = np.array(exam.subjects)
+    if sort:
+        order = np.argsort(-diffs, kind='stable')
+        diffs, subjects = diffs[order], subjects[order]
+    return pd.DataFrame({'均分差异': diffs.round(1), '累计差异': np.cumsum(diffs).round(1)}, index=subjects)
+
+
+def percentile_table(exam, x, delta=0):
+    """Percentile and rank of every subject, and with ``delta`` points added where the slider is moved."""
+    x = analysis.as_matrix(exam, x)
+    percentile, rank = exam.percentile(x)
+    table = pd.DataFrame({'百分位': percentile.round(1), '排名': rank}, index=list(exam.subjects))
+    if delta != 0:
+        percentile2, rank2 = exam.percentile(x + delta)
+        table[f'{delta:+d}分后百分位'] = percentile2.round(1)
+        table['排名变化'] = rank - rank2
+    return table
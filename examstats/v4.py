@@ -1,18 +1,30 @@
+import io
 import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-import matplotlib
 import numpy as np
 import pandas as pd
-import scipy
 import streamlit as st
-from matplotlib import pyplot as plt
 from streamlit.components.v1 import html
 
-matplotlib.rcParams['font.family'] = ['WenQuanYi Zen Hei']
-# matplotlib.rcParams['font.family'] = ['Heiti TC']
+# streamlit runs this file as a script; make the examstats package importable from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from examstats import analysis, cache, roster, tables  # noqa: E402
+from examstats.catalog import SENSITIVITY_RANGE, CatalogWatcher  # noqa: E402
+from examstats.render import STATIC_CHARTS, RenderPool, RenderQueueFull  # noqa: E402
 
 st.set_page_config(page_title='北京四中考试成绩分析', layout='wide')
 
+# every widget change reruns this script; count the reruns and time them so the cost of an interaction is visible.
+# 'run' numbers every full run as it starts; the fragments compare it with the run they last saw
+run_started = time.perf_counter()
+st.session_state['run'] = st.session_state.get('run', 0) + 1
+
 urls = [
     'https://examstats.streamlit.app',
     'https://examstats1.streamlit.app',
@@ -29,257 +41,313 @@ random.shuffle(urls)
 
 st.info(f'如果服务响应缓慢，可尝试使用备份服务：{urls[0]} 或 {urls[1]}', icon='🔗')
 
-if 'exams' not in st.session_state:
-    st.session_state['exams'] = {
-    '2026届高一上学期期中考试(2023-11)': {
-        'subject': {
-            '语文': {'total': 150, 'max': 136, 'median': 107, 'mean': 106.9, 'std': 6.9, 'count': 627},
-            '数学': {'total': 150, 'max': 149, 'median': 123, 'mean': 121.2, 'std': 14.6, 'count': 626},
-            '英语': {'total': 150, 'max': 145.5, 'median': 127, 'mean': 123.9, 'std': 10.1, 'count': 628},
-            '物理': {'total': 100, 'max': 100, 'median': 81, 'mean': 79.7, 'std': 4.1, 'count': 626},
-            '化学': {'total': 100, 'max': 100, 'median': 82, 'mean': 79.9, 'std': 14.0, 'count': 628},
-            '生物': {'total': 100, 'max': 95, 'median': 73, 'mean': 71.6, 'std': 10.8, 'count': 626},
-            '政治': {'total': 100, 'max': 94, 'median': 69, 'mean': 68.4, 'std': 10.2, 'count': 627},
-            '历史': {'total': 100, 'max': 97, 'median': 79, 'mean': 78.1, 'std': 7.1, 'count': 628},
-            '地理': {'total': 100, 'max': 94, 'median': 74, 'mean': 73.6, 'std': 9.2, 'count': 627},
-        },
-        'group': {
-            '语数英总分': {'max': 414, 'median': 357, 'mean': 352.2, 'std': 28, 'count': 624, 'include': ['语文', '数学', '英语']},
-            '9科总分': {'max': 950, 'median': 815.5, 'mean': 803.7, 'std': 87, 'count': 623, 'include': ['语文', '数学', '英语', '物理', '化学', '生物', '政治', '历史', '地理']},
-        }
-    },
-    '2026届高一上学期期末考试(2024-01)': {
-        'subject': {
-            '语文': {'total': 150, 'max': 128, 'median': 111, 'mean': 111.1, 'std': 7.30, 'count': 628},
-            '数学': {'total': 150, 'max': 147, 'median': 127, 'mean': 124.6, 'std': 11.56, 'count': 628},
-            '英语': {'total': 150, 'max': 147, 'median': 133.5, 'mean': 131.2, 'std': 7.97, 'count': 627},
-            '物理': {'total': 100, 'max': 100, 'median': 78, 'mean': 75.8, 'std': 15.90, 'count': 627},
-            '化学': {'total': 150, 'max': 145, 'median': 122, 'mean': 117.6, 'std': 24.71, 'count': 627},
-            '生物': {'total': 100, 'max': 98, 'median': 79, 'mean': 77, 'std': 12, 'count': 628},
-            '政治': {'total': 100, 'max': 96, 'median': 79, 'mean': 77.2, 'std': 6.67, 'count': 628},
-            '历史': {'total': 100, 'max': 100, 'median': 87.5, 'mean': 86.1, 'std': 5.2, 'count': 627},
-            '地理': {'total': 100, 'max': 100, 'median': 89, 'mean': 87.5, 'std': 1.92, 'count': 626},
-        },
-        'group': {
-            '语数英总分': {'max': 410.5, 'median': 371, 'mean': 366.5, 'std': 17.67, 'count': 627, 'include': ['语文', '数学', '英语']},
-            '9科总分': {'max': 988.2, 'median': 861.7, 'mean': 848.5, 'std': 60.92, 'count': 625, 'include': ['语文', '数学', '英语', '物理', '化学', '生物', '政治', '历史', '地理'], 'scale': [1, 1, 1, 1, 100.0/150, 1, 1, 1, 1]},
-        }
-    },
-    '2026届高一下学期期中考试(2024-04)': {
-        'subject': {
-            '语文': {'total': 150, 'max': 131, 'median': 109, 'mean': 108.2, 'std': 7.88, 'count': 623},
-            '数学': {'total': 150, 'max': 145, 'median': 117, 'mean': 113.4, 'std': 4.52, 'count': 623},
-            '英语': {'total': 150, 'max': 145.5, 'median': 126.5, 'mean': 123.0, 'std': 11.22, 'count': 625},
-            '物理': {'total': 100, 'max': 100, 'median': 69, 'mean': 66.1, 'std': 65, 'count': 623},
-            '化学': {'total': 100, 'max': 99, 'median': 73, 'mean': 69.9, 'std': 14.40, 'count': 627},
-            '生物': {'total': 100, 'max': 96, 'median': 66, 'mean': 62.8, 'std': 20, 'count': 624},
-            '政治': {'total': 100, 'max': 95, 'median': 74, 'mean': 72.6, 'std': 14.67, 'count': 624},
-            '历史': {'total': 100, 'max': 95.5, 'median': 82, 'mean': 81.2, 'std': 7.35, 'count': 623},
-            '地理': {'total': 100, 'max': 92, 'median': 72, 'mean': 71.5, 'std': 25, 'count': 624},
-        },
-        'group': {
-            '语数英总分': {'max': 409.5, 'median': 353, 'mean': 344.6, 'std': 247.5, 'count': 621, 'include': ['语文', '数学', '英语']},
-            '9科总分': {'max': 966.5, 'median': 782, 'mean': 768.7, 'std': 126.78, 'count': 621, 'include': ['语文', '数学', '英语', '物理', '化学', '生物', '政治', '历史', '地理']},
-        }
-    }
-}
 
-exams = st.session_state['exams']
+@st.cache_resource
+def load_exams():
+    # compiled once per process and shared by all sessions; per-user data lives in st.session_state
+    return CatalogWatcher()
+
+
+# picks up edits to exams.json on the next rerun without restarting the app
+exams = load_exams().get()
+
+if 'scores' not in st.session_state:
+    st.session_state['scores'] = {}
 
 st.sidebar.subheader('北京四中考试成绩分析')
 
 exam = st.sidebar.selectbox('选择考试', list(exams.keys()), index=len(exams)-1)
+lite_chosen = st.sidebar.toggle('简洁模式', key='lite', help='以表格代替图表，适合手机或网络较慢时使用')
 
 t1, t2 = st.sidebar.tabs(['录入成绩', '上传成绩'])
+run_stats = st.sidebar.empty()
+
+upload = t2.file_uploader('此处可上传之前下载保存的成绩，或每行一名学生的全班成绩', type='csv', key=f'{exam}-upload')
+
+
+@st.cache_data(ttl='10m')
+def load_roster(exam, version, data):
+    return roster.roster_report(exams[exam], io.BytesIO(data))
+
+
+def set_inputs(exam, scores):
+    # write straight into the number inputs' state, which is allowed before they are drawn or in a callback
+    for sub, score in scores.items():
+        st.session_state[f'{exam}-{sub}-ni'] = float(score)
+
 
-upload = t2.file_uploader('此处可上传之前下载保存的成绩', type='csv', key=f'{exam}-upload')
+def apply_paste(exam):
+    # form callback: runs before the script, so the pasted row lands in the inputs of this same submit
+    text = st.session_state[f'{exam}-paste']
+    if text.strip():
+        try:
+            set_inputs(exam, roster.parse_row(exams[exam], text))
+            st.session_state[f'{exam}-paste'] = ''
+        except ValueError as e:
+            st.session_state['paste-error'] = str(e)
 
+
+class_report = None
 if upload:
-    exams[exam]['scores'] = pd.read_csv(upload).to_dict(orient='records')[0]
-elif 'scores' not in exams[exam]:
-    exams[exam]['scores'] = {sub: 0 for sub in exams[exam]['subject'].keys()}
-
-exams[exam]['scores'] = {
-    sub: t1.number_input(
-        sub, min_value=0.0, max_value=float(exams[exam]['subject'][sub]['total']),
-        value=float(exams[exam]['scores'][sub]), step=1.0, key=f'{exam}-{sub}-ni') for sub in exams[exam]['subject'].keys()}
-
-
-t1.download_button('下载保存', pd.DataFrame(exams[exam]['scores'], index=[0]).to_csv(index=False), f'{exam}.csv', 'text/csv')
-
-
-def plot_subject_distribution(exam, scores, subject, ax):
-    stats = exams[exam]['subject'][subject]
-    x = np.linspace(0, stats['total'], 400)
-    ax.plot(x, scipy.stats.norm.pdf(x, stats['mean'], stats['std']), label='成绩分布')
-    # mark mean on the curve
-    ax.vlines(stats['mean'], 0, 0.1, label='平均分', color='g', linestyle='--', linewidth=1)
-    ax.annotate(f'{stats["mean"]:.1f}', (stats['mean'], 0.005), xytext=(stats['mean']+1, 0.005))
-    # mark maximum on the curve
-    ax.vlines(stats['max'], 0, 0.1, label='最高分', color='b', linestyle='--', linewidth=1)
-    ax.annotate(f'{stats["max"]}', (stats['max'], 0.09), xytext=(stats['max']+1, 0.09))
-    # mark score on the curve
-    ax.vlines(scores[subject], 0, 0.1, label='我的成绩', color='r', linestyle='--', linewidth=1)
-    ax.annotate(f'{scores[subject]}', (scores[subject], 0.06), xytext=(scores[subject]+1, 0.06), color='r')
-    # calculate percentile
-    percentile = scipy.stats.norm.cdf(scores[subject], stats['mean'], stats['std']) * 100
-    rank = int((100 - percentile) / 100 * stats['count'])
-    # format
-    ax.set_xlim(0, stats['total']+1)
-    ax.set_ylim(0, 0.1)
-    ax.set_title(f'{subject} (Rank:{rank}) ({percentile:.1f}%)')
-    ax.legend(loc='upper left')
+    try:
+        class_report = load_roster(exam, exams[exam].version, upload.getvalue())
+    except ValueError as e:
+        t2.error(str(e))
+    if class_report is not None and len(class_report) == 1:
+        # a single row is one student's saved scores; apply it once, not on every rerun while the file is attached
+        if st.session_state.get(f'{exam}-applied-upload') != upload.file_id:
+            st.session_state[f'{exam}-applied-upload'] = upload.file_id
+            st.session_state['scores'][exam] = class_report.iloc[0][list(exams[exam].subjects)].to_dict()
+            set_inputs(exam, st.session_state['scores'][exam])
+        class_report = None
+if exam not in st.session_state['scores']:
+    st.session_state['scores'][exam] = {sub: 0 for sub in exams[exam].subjects}
+
+# inputs of an exam that was not selected in the last run have lost their state; seed them from the saved scores
+for sub in exams[exam].subjects:
+    st.session_state.setdefault(f'{exam}-{sub}-ni', float(st.session_state['scores'][exam].get(sub, 0)))
+
+# one form for all subjects: typing does not rerun the script, the scores are applied together on submit
+form = t1.form(f'{exam}-scores')
+form.text_input('粘贴一行成绩', key=f'{exam}-paste', placeholder='按科目顺序，以空格、逗号或制表符分隔')
+scores = st.session_state['scores'][exam] = {
+    sub: form.number_input(sub, min_value=0.0, max_value=float(total), step=1.0, key=f'{exam}-{sub}-ni')
+    for sub, total in zip(exams[exam].subjects, exams[exam].total)}
+form.form_submit_button('确定', on_click=apply_paste, args=(exam,), type='primary')
+if 'paste-error' in st.session_state:
+    t1.error(st.session_state.pop('paste-error'))
+
+
+t1.download_button('下载保存', pd.DataFrame(scores, index=[0]).to_csv(index=False), f'{exam}.csv', 'text/csv')
+
+
+@st.cache_resource
+def render_pool():
+    # one pool of warm render processes per server process, shared by all sessions
+    return RenderPool()
+
+
+@st.cache_resource
+def chart_cache():
+    # PNG bytes shared by all sessions, keyed on exam version and rounded scores, bounded by total size;
+    # backed by a disk cache shared with the other replicas when EXAMSTATS_DISK_CACHE is set
+    return cache.chart_cache()
+
+
+@st.cache_resource(max_entries=8)
+def prerender(versions):
+    # runs once per catalog version: draws the score-independent charts in the background while the
+    # first sessions render their own
+    thread = threading.Thread(
+        target=chart_cache().prerender, args=(render_pool().render, exams, STATIC_CHARTS), daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def prefetch_executor():
+    # a couple of threads per server process that fill the chart cache for tabs nobody has opened yet
+    return ThreadPoolExecutor(2, thread_name_prefix='prefetch')
+
+
+def prefetch_charts(exam, scores, charts):
+    # render the charts of the closed tabs while the user reads the open one; RenderPool.prefetch skips
+    # them when the workers are busy, so prefetching never delays a chart someone is waiting for
+    pool, chart_cache_ = render_pool(), chart_cache()
+    x = exams[exam].vector(scores)
+    for kind, options in charts:
+        if cache.chart_key(exams[exam], x, kind, options) not in chart_cache_:
+            prefetch_executor().submit(chart_cache_.chart, pool.prefetch, exams[exam], x, kind, **options)
+
+
+def keep(key, default):
+    # widgets inside a closed tab are not rendered, and Streamlit drops the state of widgets that were
+    # not rendered; keep their values under a plain session key and restore them when the tab reopens
+    if key not in st.session_state:
+        st.session_state[key] = st.session_state.setdefault('kept', {}).get(key, default)
+    return key
+
+
+def kept(key, value):
+    st.session_state.setdefault('kept', {})[key] = value
+    return value
+
+
+def show_chart(container, exam, scores, kind, **options):
+    # scores=None for the charts in STATIC_CHARTS. A chart's cache key is exactly its inputs (exam
+    # version, rounded scores, options), so a chart whose inputs did not change is a cache hit, not a render
+    x = None if scores is None else exams[exam].vector(scores)
+    # the placeholder goes out before the render, so the chart fills its place when it is ready
+    placeholder = container.empty()
+    placeholder.caption('图表生成中…')
+    try:
+        png = chart_cache().chart(render_pool().render, exams[exam], x, kind, **options)
+        placeholder.image(png, width='stretch')
+    except RenderQueueFull:
+        placeholder.warning('服务繁忙，图表暂时无法生成，请稍后刷新。')
+
+
+LITE_COLUMNS = {
+    '成绩分布': st.column_config.AreaChartColumn('成绩分布', y_min=0),
+    '均分差异': st.column_config.NumberColumn(format='%+.1f'),
+    '累计差异': st.column_config.NumberColumn(format='%+.1f'),
+    '排名变化': st.column_config.NumberColumn(format='%+d'),
+}
 
 
-@st.cache_data(ttl='10m')
-def plot_subject_3by3_chart(exam, scores, _plot_func):
-    fig, ax = plt.subplots(3, 3, figsize=(12, 8))
-    ax = ax.flatten()
-    for i, (sub, score) in enumerate(scores.items()):
-        _plot_func(exam, scores, sub, ax[i])
-    fig.tight_layout()
-    return fig
-
-
-def plot_group_distribution(exam, scores, group, ax):
-    stats = exams[exam]['group'][group]
-    if 'scale' not in stats:
-        total = sum(exams[exam]['subject'][sub]['total'] for sub in stats['include'])
-        score = sum(scores[sub] for sub in stats['include'])
+def lite_table(container, table, columns=None):
+    # lite mode: the chart's numbers as a table, the distribution curves and percentiles drawn in the browser
+    config = {
+        name: st.column_config.ProgressColumn(name, format='%.1f', min_value=0, max_value=100)
+        if name.endswith('百分位') else LITE_COLUMNS.get(name) for name in table.columns}
+    container.dataframe(table, width='stretch', column_order=columns,
+                        column_config={name: c for name, c in config.items() if c is not None})
+
+
+def partial_rerun(section):
+    # called first in every fragment: a fragment that already ran in the current full run of the script
+    # is being rerun on its own
+    seen = st.session_state.setdefault('fragment-runs', {})
+    if seen.get(section) == st.session_state['run']:
+        st.session_state['partial-reruns'] = st.session_state.get('partial-reruns', 0) + 1
+    seen[section] = st.session_state['run']
+
+
+# Each tab whose chart depends on a widget is a fragment: the widget's changes rerun only that fragment,
+# with the exam and scores of the last full run, instead of the whole script. Scores only change through
+# the form in the sidebar, which reruns everything.
+
+@st.fragment
+def combination_section(exam, scores, lite):
+    # depends on: exam, scores, 自定义组合
+    partial_rerun('combination')
+    combo = kept(f'{exam}-combo', st.multiselect('自定义组合', exams[exam].subjects, key=keep(f'{exam}-combo', [])))
+    if len(combo) > 1 and lite:
+        # the combination's distribution is simulated, which has no table-lookup equivalent
+        st.caption('简洁模式下不显示自定义组合的分布。')
+    elif len(combo) > 1:
+        show_chart(st, exam, scores, 'combination', include=combo)
+        st.caption('自定义组合的分布由各科均分、标准差及科目间相关性模拟得到。')
+
+
+@st.fragment
+def waterfall_section(exam, scores, lite):
+    # depends on: exam, scores, 按差异排序
+    partial_rerun('waterfall')
+    diff_sort = kept('diff-sort', st.checkbox('按差异排序', key=keep('diff-sort', False)))
+    if lite:
+        lite_table(st, tables.waterfall_table(exams[exam], exams[exam].vector(scores), sort=diff_sort))
     else:
-        total = sum(exams[exam]['subject'][sub]['total'] * stats['scale'][i] for i, sub in enumerate(stats['include']))
-        score = sum(scores[sub] * stats['scale'][i] for i, sub in enumerate(stats['include']))
-    x = np.linspace(0, total, 400)
-    ax.plot(x, scipy.stats.norm.pdf(x, stats['mean'], stats['std']), label='成绩分布')
-    # mark mean on the curve
-    ax.vlines(stats['mean'], 0, 0.1, label='平均分', color='g', linestyle='--', linewidth=1)
-    ax.annotate(f'{stats["mean"]:.0f}', (stats['mean'], 0.001), xytext=(stats['mean']+1, 0.001))
-    # mark maximum on the curve
-    ax.vlines(stats['max'], 0, 0.1, label='最高分', color='b', linestyle='--', linewidth=1)
-    ax.annotate(f'{stats["max"]}', (stats['max'], 0.018), xytext=(stats['max']+1, 0.018))
-    # mark score on the curve
-    ax.vlines(score, 0, 0.1, label='我的成绩', color='r', linestyle='--', linewidth=1)
-    ax.annotate(f'{score}', (score, 0.011), xytext=(score+1, 0.011), color='r')
-    # calculate percentile
-    percentile = scipy.stats.norm.cdf(score, stats['mean'], stats['std']) * 100
-    rank = int((100 - percentile) / 100 * stats['count'])
-    # format
-    ax.set_xlim(0, total+1)
-    ax.set_ylim(0, 0.02)
-    ax.set_yticks([0, 0.01, 0.02])
-    ax.set_title(f'{group} (Rank:{rank}) ({percentile:.1f}%)')
-    ax.legend(loc='upper left')
+        show_chart(st, exam, scores, 'waterfall', sort=diff_sort)
 
 
-@st.cache_data(ttl='10m')
-def plot_subject_3by3_chart(exam, scores, _plot_func):
-    fig, ax = plt.subplots(3, 3, figsize=(12, 8))
-    ax = ax.flatten()
-    for i, (sub, score) in enumerate(scores.items()):
-        _plot_func(exam, scores, sub, ax[i])
-    fig.tight_layout()
-    return fig
+@st.fragment
+def percentile_section(exam, scores, lite):
+    # depends on: exam, scores, 分数变化
+    partial_rerun('percentile')
+    delta = kept('delta', st.slider('分数变化', -SENSITIVITY_RANGE, SENSITIVITY_RANGE, key=keep('delta', 0)))
+    if lite:
+        lite_table(st, tables.percentile_table(exams[exam], exams[exam].vector(scores), delta=delta))
+    else:
+        show_chart(st, exam, scores, 'percentile', delta=delta)
 
 
-@st.cache_data(ttl='10m')
-def plot_group_3by3_chart(exam, scores, _plot_func):
-    fig, ax = plt.subplots(3, 3, figsize=(12, 8))
-    ax = ax.flatten()
-    for i, grp in enumerate(exams[exam]['group'].keys()):
-        _plot_func(exam, scores, grp, ax[i])
-    for i in range(i+1, 9):
-        ax[i].set_axis_off()
-    fig.tight_layout()
-    return fig
-
-
-@st.cache_resource(ttl='1d')
-def plot_all_subject_distribution(exam, scores):
-    # plot all bell curves of 9 subjects in one chart
-    fig, ax = plt.subplots(figsize=(12, 5))
-    for sub in exams[exam]['subject'].keys():
-        stats = exams[exam]['subject'][sub]
-        x = np.linspace(0, stats['total'], 400)
-        ax.plot(x, scipy.stats.norm.pdf(x, stats['mean'], stats['std']), label=sub)
-    xrange = max([v['max'] for k, v in exams[exam]['subject'].items()])+1
-    ax.set_xlim(0, xrange)
-    ax.set_ylim(0, 0.10)
-    ax.legend(loc='upper left')
-    return fig
+@st.fragment
+def planner_section(exam, scores):
+    # depends on: exam, scores, 目标类型 and the target slider
+    partial_rerun('planner')
+    if kept('target-type', st.radio('目标类型', ['名次', '百分位'], horizontal=True, key=keep('target-type', '名次'))) == '名次':
+        target = st.slider('目标名次', 0, int(exams[exam].count.max()), key=keep('target-rank', 50))
+        st.dataframe(plan_targets(exam, scores, rank=kept('target-rank', target)), width='stretch')
+    else:
+        target = st.slider('目标百分位', 1.0, 99.9, step=0.1, key=keep('target-percentile', 90.0))
+        st.dataframe(plan_targets(exam, scores, percentile=kept('target-percentile', target)), width='stretch')
+    st.caption('目标成绩为空表示超过满分，无法达到。')
 
 
-@st.cache_data(ttl='10m')
-def plot_score_diff_waterfall_chart(exam, scores, sort=False):
-    # plot stacked waterfall chart vertically showing how difference in each subject contributes to the total difference
-    fig, ax = plt.subplots(figsize=(12, 5))
-    # calculate difference
-    diffs = {sub: scores[sub] - exams[exam]['subject'][sub]['mean'] for sub in exams[exam]['subject'].keys()}
-    # sort by difference
-    if sort:
-        diffs = dict(sorted(diffs.items(), key=lambda item: item[1], reverse=True))
-    # plot cumulative difference
-    cumsum = 0
-    for sub, diff in diffs.items():
-        cumsum += diff
-        label = f'{diff:.0f} ({cumsum:.0f})'
-        if diff > 0:
-            ax.vlines(sub, cumsum-diff, cumsum, color='r', linewidth=73, alpha=0.8)
-            ax.text(sub, cumsum, label, ha='center', va='bottom')
-        else:
-            ax.vlines(sub, cumsum, cumsum-diff, color='g', linewidth=73, alpha=0.8)
-            ax.text(sub, cumsum-diff, label, ha='center', va='bottom')
-    # plot zero line
-    ax.axhline(0, color='k', linewidth=1, linestyle='--')
-    ax.set_ylabel('累计均分差异')
-    ax.set_title('各学科平均分差异分析')
-    ax.set_xlim(-0.5, len(diffs)-0.5)
-    return fig
+def student_summary(exam, scores):
+    # table lookups only, microseconds: shown before any chart so the page has content while charts render
+    e = exams[exam]
+    x = e.vector(scores)
+    group = analysis.group_scores(e, x)
+    percentile, rank = (np.concatenate(pair) for pair in zip(analysis.percentile(e, x), analysis.group_percentile(e, x)))
+    return pd.DataFrame({
+        '成绩': np.concatenate([x, group]),
+        '百分位': percentile.round(1),
+        '排名': rank,
+        '与平均分差': np.concatenate([x - e.mean, group - e.group_mean]).round(1),
+    }, index=e.subjects + e.groups).astype(object).T
 
 
-@st.cache_data(ttl='10m')
-def plot_subject_percentile_chart(exam, scores, delta=0):
-    fig, ax = plt.subplots(figsize=(12, 5))
-    for sub in exams[exam]['subject'].keys():
-        stats = exams[exam]['subject'][sub]
-        percentile = scipy.stats.norm.cdf(scores[sub], stats['mean'], stats['std']) * 100
-        rank = int((100 - percentile) / 100 * stats['count'])
-        ax.vlines(sub, 0, 100, color='grey', linewidth=1, linestyle='--')
-        ax.scatter(sub, percentile, color='r', s=50, zorder=3)
-        if delta > 0:
-            ax.annotate(f'{percentile:.1f}% ({rank})', (sub, max(0, percentile-2)), ha='center', va='top', color='r', zorder=4)
-        else:
-            ax.annotate(f'{percentile:.1f}% ({rank})', (sub, percentile+2), ha='center', va='bottom', color='r', zorder=4)
-        if delta != 0:
-            percentile2 = scipy.stats.norm.cdf(scores[sub]+delta, stats['mean'], stats['std']) * 100
-            rank2 = int((100 - percentile2) / 100 * stats['count'])
-            ax.scatter(sub, percentile2, color='g', s=50, zorder=3)
-            label = f'{percentile2:.1f}% ({rank-rank2:+.0f})'
-            if delta > 0:
-                ax.annotate(label, (sub, min(100, percentile2+2)), ha='center', va='bottom', color='g', zorder=4)
-            else:
-                ax.annotate(label, (sub, percentile2-2), ha='center', va='top', color='g', zorder=4)
-    ax.set_xlim(-0.5, len(exams[exam]['subject'])-0.5)
-    ax.set_ylim(0, 100)
-    ax.set_ylabel('百分位')
-    ax.set_title('各学科百分位和敏感度分析', pad=20)
-    return fig
+def plan_targets(exam, scores, percentile=None, rank=None):
+    e = exams[exam]
+    current = np.concatenate([e.vector(scores), analysis.group_scores(e, scores)])
+    required, gap = analysis.targets(e, scores, percentile, rank)
+    return pd.DataFrame({'当前成绩': current, '目标成绩': required, '差距': gap}, index=e.subjects + e.groups)
 
 
 # if all scores are 0, show a warning
-if all(score == 0 for score in exams[exam]['scores'].values()):
+if all(score == 0 for score in scores.values()):
     st.warning('请在左侧输入您的成绩。')
 
+# lite mode: chosen in the sidebar, or forced while the render workers are starting or backed up, so a
+# busy replica keeps answering in milliseconds instead of queueing every session behind the renders
+lite = lite_chosen or render_pool().overloaded()
+if lite and not lite_chosen:
+    st.info('服务繁忙，已暂时切换到简洁模式，图表稍后恢复。', icon='⏳')
+
 st.write(exam)
 
-tb1, tb2, tb3, tb4, tb5 = st.tabs(['单科分布', '组合分布', '均分差异', '学科优势', '学科分布'])
-tb1.pyplot(plot_subject_3by3_chart(exam, exams[exam]['scores'], plot_subject_distribution))
-tb2.pyplot(plot_group_3by3_chart(exam, exams[exam]['scores'], plot_group_distribution))
-diff_sort = tb3.checkbox('按差异排序')
-tb3.pyplot(plot_score_diff_waterfall_chart(exam, exams[exam]['scores'], diff_sort))
-delta = tb4.slider('分数变化', -20, 20, 0)
-tb4.pyplot(plot_subject_percentile_chart(exam, exams[exam]['scores'], delta))
-tb5.pyplot(plot_all_subject_distribution(exam, exams[exam]['scores']))
-st.caption('**注意：** 移动端请用系统浏览器打开以获得最佳体验。以上分布仅供参考，不代表真实分布。排名根据正态分布估计，可能存在误差。数据仅个人可见，不会被记录。')
+if any(score != 0 for score in scores.values()):
+    st.dataframe(student_summary(exam, scores), width='stretch')
+
+if class_report is not None:
+    st.subheader(f'全班成绩（{len(class_report)}人）')
+    st.dataframe(roster.summarize(exams[exam], class_report).round(1), width='stretch')
+    st.dataframe(class_report.round(1), width='stretch', hide_index=True)
+    st.download_button('下载全班分析', class_report.to_csv(index=False), f'{exam}-全班.csv', 'text/csv')
+
+# switching tabs reruns the script and only the open tab's section runs, so a rerun renders one chart
+tb1, tb2, tb3, tb4, tb5, tb6 = st.tabs(
+    ['单科分布', '组合分布', '均分差异', '学科优势', '学科分布', '目标规划'], key='chart-tab', on_change='rerun')
+if tb1.open:
+    if lite:
+        lite_table(tb1, tables.distribution_table(exams[exam], exams[exam].vector(scores)))
+    else:
+        show_chart(tb1, exam, scores, 'subjects')
+if tb2.open:
+    if lite:
+        lite_table(tb2, tables.distribution_table(exams[exam], exams[exam].vector(scores), groups=True))
+    else:
+        show_chart(tb2, exam, scores, 'groups')
+    with tb2:
+        combination_section(exam, scores, lite)
+if tb3.open:
+    with tb3:
+        waterfall_section(exam, scores, lite)
+if tb4.open:
+    with tb4:
+        percentile_section(exam, scores, lite)
+if tb5.open:
+    if lite:
+        lite_table(tb5, tables.distribution_table(exams[exam], exams[exam].vector(scores)),
+                   ['平均分', '最高分', '满分', '成绩分布'])
+    else:
+        show_chart(tb5, exam, None, 'all')
+if tb6.open:
+    with tb6:
+        planner_section(exam, scores)
+combo = st.session_state.get('kept', {}).get(f'{exam}-combo', [])
+diff_sort = st.session_state.get('kept', {}).get('diff-sort', False)
+delta = st.session_state.get('kept', {}).get('delta', 0)
+# started here rather than before the page: a new server process would otherwise hold the first
+# session's content until the render workers are up
+prerender(tuple((name, e.version) for name, e in exams.items()))
+if not lite:
+    prefetch_charts(exam, scores, [('subjects', {}), ('groups', {}), ('waterfall', {'sort': diff_sort}),
+                                   ('percentile', {'delta': delta})]
+                    + ([('combination', {'include': combo})] if len(combo) > 1 else []))
+st.caption('**注意：** 移动端请用系统浏览器打开以获得最佳体验。以上分布仅供参考，不代表真实分布。排名优先采用学校公布的一分一段表，未公布时根据正态分布估计，可能存在误差。数据仅个人可见，不会被记录。')
 
 
 #this code below is the statcounter tracking code
@@ -302,4 +370,12 @@ alt="Web Analytics"
 referrerPolicy="no-referrer-when-downgrade"></a></div></noscript>
 <!-- End of Statcounter Code -->
 """
-html(takip,width=1, height=1)
\ No newline at end of file
+html(takip,width=1, height=1)
+
+# counted together at the end, so a run that raised or was interrupted by a newer rerun is not counted at all
+elapsed = time.perf_counter() - run_started
+st.session_state['reruns'] = st.session_state.get('reruns', 0) + 1
+st.session_state['rerun-time'] = st.session_state.get('rerun-time', 0) + elapsed
+run_stats.caption(f'本会话已运行 {st.session_state["reruns"]} 次，本次 {elapsed * 1000:.0f} ms，'
+                  f'平均 {st.session_state["rerun-time"] / st.session_state["reruns"] * 1000:.0f} ms；'
+                  f'局部刷新 {st.session_state.get("partial-reruns", 0)} 次')
\ No newline at end of file
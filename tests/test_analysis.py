@@ -0,0 +1,15 @@
+import numpy as np
+
+import examstats
+
+EXAM = list(examstats.load_catalog().values())[-1]
+
+
+def test_targets_per_student():
+    x = np.full((3, len(EXAM.subjects)), 100.0)
+    percentile = np.array([[50], [90], [99]])
+    required, gap = examstats.targets(EXAM, x, percentile=percentile)
+    assert required.shape == gap.shape == (3, len(EXAM.subjects) + len(EXAM.groups))
+    for i in range(3):
+        one, _ = examstats.targets(EXAM, x[i], percentile=percentile[i, 0])
+        np.testing.assert_array_equal(required[i], one)
@@ -0,0 +1,58 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from examstats import api
+from examstats.catalog import CatalogWatcher
+
+
+@pytest.fixture(scope='module')
+def server():
+    handler = type('Handler', (api.Handler,), {'catalog': CatalogWatcher(), 'batcher': api.Batcher()})
+    server = api.Server(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def post(server, path, body):
+    conn = HTTPConnection(*server.server_address)
+    conn.request('POST', path, body if isinstance(body, str) else json.dumps(body))
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def scores(server, **changes):
+    conn = HTTPConnection(*server.server_address)
+    conn.request('GET', '/exams')
+    subjects = list(json.loads(conn.getresponse().read()).values())[-1]['subjects']
+    return {sub: changes.get(sub, 80.0) for sub in subjects}
+
+
+def test_rank(server):
+    status, body = post(server, '/rank', {'scores': scores(server)})
+    assert status == 200
+    assert all(isinstance(rank, int) and rank >= 0 for rank in body['subjects'].values())
+
+
+@pytest.mark.parametrize('score', ['NaN', 'Infinity', -1, 1e6])
+def test_scores_out_of_range_are_rejected(server, score):
+    body = json.dumps({'scores': scores(server, 语文=0.5)}).replace('0.5', str(score))
+    status, reply = post(server, '/percentile', body)
+    assert status == 400
+    assert '语文' in reply['error']
+
+
+@pytest.mark.parametrize('body', [[1, 2], {'scores': [80] * 9}, '"text"', {'exam': ['x']}, {'exam': {}}, {'exam': 1}])
+def test_malformed_body_is_a_bad_request(server, body):
+    assert post(server, '/rank', body)[0] == 400
+
+
+@pytest.mark.parametrize('concurrency, requests', [(8, 4), (3, 10), (2, 1)])
+def test_load_test_sends_every_request(server, concurrency, requests):
+    url = 'http://{}:{}'.format(*server.server_address)
+    result = api.load_test(url, concurrency, requests)
+    assert result['requests'] == requests
+    assert result['errors'] == 0
@@ -0,0 +1,124 @@
+import hashlib
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from examstats import cache, load_catalog
+
+EXAM = list(load_catalog().values())[-1]
+X = np.full(len(EXAM.subjects), 80.0)
+
+
+class Renders:
+    """A stand-in render function: returns ``size`` bytes naming its inputs and counts its calls."""
+
+    def __init__(self, size=100):
+        self.size = size
+        self.calls = []
+
+    def __call__(self, exam, x, kind, **options):
+        self.calls.append((None if x is None else x.tolist(), kind, options))
+        return f'{kind}{options}'.encode().ljust(self.size, b'.')
+
+
+def test_eviction_keeps_the_total_within_budget_least_recently_used_first():
+    render = Renders()
+    charts = cache.ChartCache(budget=250)
+    a, b, c = (cache.chart_key(EXAM, X, 'waterfall', {'sort': sort}) for sort in (False, True, None))
+    charts.chart(render, EXAM, X, 'waterfall', sort=False)
+    charts.chart(render, EXAM, X, 'waterfall', sort=True)
+    charts.chart(render, EXAM, X, 'waterfall', sort=False)
+    charts.chart(render, EXAM, X, 'waterfall', sort=None)
+    # sort=True was used least recently
+    assert list(charts.entries) == [a, c]
+    assert b not in charts
+    assert charts.stats()['bytes'] == 200 <= charts.budget
+
+
+def test_chart_larger_than_the_budget_is_not_stored():
+    charts = cache.ChartCache(budget=50)
+    assert len(charts.chart(Renders(), EXAM, X, 'subjects')) == 100
+    assert charts.stats()['entries'] == 0
+
+
+def test_scores_rounding_to_the_same_step_share_an_entry():
+    render = Renders()
+    charts = cache.ChartCache()
+    first = charts.chart(render, EXAM, X + 0.1, 'subjects')
+    assert charts.chart(render, EXAM, X - 0.2, 'subjects') is first
+    # rendered once, from the rounded scores
+    assert render.calls == [(X.tolist(), 'subjects', {})]
+    charts.chart(render, EXAM, X + 0.5, 'subjects')
+    assert len(render.calls) == 2
+
+
+def test_list_and_tuple_options_share_an_entry():
+    render = Renders()
+    charts = cache.ChartCache()
+    charts.chart(render, EXAM, X, 'combination', include=['语文', '数学'])
+    charts.chart(render, EXAM, X, 'combination', include=('语文', '数学'))
+    assert len(render.calls) == 1
+
+
+def test_hits_and_misses_are_counted():
+    charts = cache.ChartCache()
+    render = Renders()
+    charts.chart(render, EXAM, X, 'subjects')
+    charts.chart(render, EXAM, X, 'subjects')
+    charts.chart(render, EXAM, None, 'all')
+    assert cache.chart_key(EXAM, X, 'subjects', {}) in charts
+    stats = charts.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_skipped_prefetch_is_not_cached():
+    charts = cache.ChartCache()
+    assert charts.chart(lambda *args, **options: None, EXAM, X, 'subjects') is None
+    assert cache.chart_key(EXAM, X, 'subjects', {}) not in charts
+    assert charts.chart(Renders(), EXAM, X, 'subjects') is not None
+
+
+def payload(key):
+    return hashlib.sha1(repr(key).encode()).digest() * 1000
+
+
+def hammer(path, budget, seed, rounds=300):
+    # one replica: random puts and gets of 20 KB entries; returns the number of reads that came back wrong
+    disk = cache.DiskCache(path, budget)
+    rng = random.Random(seed)
+    corrupt = 0
+    for _ in range(rounds):
+        key = ('chart', rng.randrange(40))
+        if rng.random() < 0.5:
+            disk.put(key, payload(key))
+        else:
+            data = disk.get(key)
+            corrupt += data is not None and data != payload(key)
+    return corrupt
+
+
+def test_disk_cache_shared_by_processes(tmp_path):
+    path, budget = str(tmp_path / 'charts.db'), 200_000
+    with ProcessPoolExecutor(4, mp_context=get_context('spawn')) as pool:
+        corrupt = list(pool.map(hammer, [path] * 4, [budget] * 4, range(4)))
+    assert corrupt == [0] * 4
+    stats = cache.DiskCache(path, budget).stats()
+    assert 0 < stats['bytes'] <= budget
+
+
+def test_disk_hit_only_writes_a_stale_last_use(tmp_path):
+    disk = cache.DiskCache(str(tmp_path / 'charts.db'))
+    disk.put('key', b'png')
+    db = disk.connect()
+    writes = db.total_changes
+    assert disk.get('key') == b'png'
+    assert db.total_changes == writes
+    with db:
+        db.execute('UPDATE charts SET used = ?', (time.time() - 2 * cache.DISK_CACHE_TOUCH,))
+    writes = db.total_changes
+    assert disk.get('key') == b'png'
+    assert db.total_changes == writes + 1
+    assert db.execute('SELECT used FROM charts').fetchone()[0] > time.time() - 5
@@ -0,0 +1,105 @@
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+from examstats import analysis
+from examstats.catalog import CATALOG_PATH, CatalogError, CatalogWatcher, compile_catalog, compile_exam
+
+with open(CATALOG_PATH, encoding='utf-8') as f:
+    RAW = json.load(f)
+NAME = list(RAW)[-1]
+
+
+def edited(edit):
+    raw = copy.deepcopy(RAW)
+    edit(raw[NAME])
+    return raw
+
+
+def first_group(spec):
+    return next(iter(spec['group'].values()))
+
+
+BAD_EDITS = {
+    'stats not an object': lambda s: s['subject'].__setitem__('语文', 150),
+    'quoted number': lambda s: s['subject']['语文'].__setitem__('std', '7.88'),
+    'bool count': lambda s: s['subject']['语文'].__setitem__('count', True),
+    'include not a list': lambda s: first_group(s).__setitem__('include', '语文'),
+    'repeated subject': lambda s: first_group(s).__setitem__('include', ['语文', '语文', '数学']),
+    'scale not a list': lambda s: first_group(s).__setitem__('scale', 2),
+    'bands not pairs': lambda s: s['subject']['语文'].__setitem__('bands', [130, 1]),
+    'quoted band count': lambda s: s['subject']['语文'].__setitem__('bands', [[130, '1']]),
+    'quoted correlation': lambda s: s.__setitem__('correlation', '0.3'),
+    'ragged correlation': lambda s: s.__setitem__('correlation', [[1, 0], [0]]),
+}
+
+
+@pytest.mark.parametrize('edit', BAD_EDITS.values(), ids=BAD_EDITS.keys())
+def test_malformed_spec_is_a_catalog_error(edit):
+    with pytest.raises(CatalogError):
+        compile_catalog(edited(edit))
+
+
+def test_malformed_top_level_is_a_catalog_error():
+    with pytest.raises(CatalogError):
+        compile_catalog([RAW[NAME]])
+    with pytest.raises(CatalogError):
+        compile_catalog({NAME: [RAW[NAME]]})
+
+
+def test_watcher_keeps_previous_catalog_on_bad_edit(tmp_path):
+    path = tmp_path / 'exams.json'
+    path.write_text(json.dumps(RAW, ensure_ascii=False), encoding='utf-8')
+    watcher = CatalogWatcher(path)
+    exams = watcher.get()
+    path.write_text(json.dumps(edited(BAD_EDITS['stats not an object']), ensure_ascii=False), encoding='utf-8')
+    mtime = path.stat().st_mtime_ns + 10**9
+    os.utime(path, ns=(mtime, mtime))
+    assert watcher.get() is exams
+    assert watcher.get() is exams
+
+
+def banded_exam():
+    spec = copy.deepcopy(RAW[NAME])
+    spec['subject']['语文']['bands'] = [[130, 1], [120, 10], [110, 100], [100, 400], [80, 623]]
+    spec['group']['9科总分']['bands'] = [[900, 5], [800, 150], [700, 500], [600, 621]]
+    return compile_exam(NAME, spec)
+
+
+@pytest.mark.parametrize('score, rank', [(79, 623), (80, 400), (109.5, 100), (110, 10), (130, 0), (150, 0)])
+def test_band_rank_at_and_between_boundaries(score, rank):
+    # students strictly above the score: those at or above the next listed score
+    exam = banded_exam()
+    x = np.full(len(exam.subjects), 60.0)
+    x[0] = score
+    assert exam.percentile(x)[1][0] == rank
+    # off the half-point grid the rank comes from the band table directly rather than the lookup table
+    x[0] = score + 0.2
+    assert exam.percentile(x)[1][0] == rank
+
+
+@pytest.mark.parametrize('first, rank', [(100.25, 5), (99.75, 150)])
+def test_group_band_rank_for_an_off_grid_score(first, rank):
+    exam = banded_exam()
+    # 9科总分 of 800.25 and 799.75
+    x = np.array([first] + [100.0] * 7 + [0.0])
+    percentile, ranks = analysis.group_percentile(exam, x)
+    assert ranks[exam.groups.index('9科总分')] == rank
+    assert percentile[exam.groups.index('9科总分')] == pytest.approx((621 - rank) / 621 * 100)
+
+
+def test_target_rank_on_a_band_boundary():
+    # exactly 10 students score above 110, so rank 10 needs 110, not the next band up
+    exam = banded_exam()
+    assert exam.required(rank=10)[0] == 110
+    assert exam.required(rank=9)[0] == 120
+    assert exam.required(percentile=100 * (1 - 10 / 623))[0] == 110
+
+
+def test_target_percentile_out_of_range_is_clipped():
+    exam = banded_exam()
+    assert exam.required(percentile=120)[0] == 130
+    assert exam.required(percentile=-5)[0] == 80
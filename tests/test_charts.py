@@ -0,0 +1,96 @@
+import gc
+import hashlib
+import io
+import logging
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from matplotlib import pyplot
+from PIL import Image
+
+from examstats import charts, load_catalog, render
+
+EXAMS = list(load_catalog().values())
+KINDS = [('subjects', {}), ('groups', {}), ('combination', {'include': ['语文', '数学']}), ('all', {}),
+         ('waterfall', {'sort': True}), ('percentile', {'delta': 5})]
+
+
+def test_grid_cache_is_bounded_by_bytes():
+    first, second, third = ((exam, 'groups') for exam in EXAMS[-3:])
+    size = charts.GridCache().get(*first).nbytes
+    cache = charts.GridCache(budget=2 * size + size // 2)
+    grid = cache.get(*first)
+    assert cache.get(*first) is grid
+    cache.get(*second)
+    cache.get(*first)
+    cache.get(*third)
+    # the least recently used one went
+    assert list(cache.entries) == [first, third]
+    assert cache.size == sum(g.nbytes for g in cache.entries.values())
+
+
+def test_composite_matches_a_fresh_background():
+    exam = EXAMS[-1]
+    x = np.full(len(exam.subjects), 75.0)
+    cache = charts.GridCache()
+    cache.get(exam, 'groups').render(np.full(len(exam.subjects), 95.0))
+    assert cache.get(exam, 'groups').render(x) == charts.GridCache().get(exam, 'groups').render(x)
+
+
+def decoded(png):
+    return np.asarray(Image.open(io.BytesIO(png)).convert('RGB')).astype(int)
+
+
+@pytest.mark.parametrize('kind', charts.GRIDS)
+def test_composite_at_full_marks_matches_the_whole_figure(kind):
+    # the score label reaches furthest right at full marks; none of it may be cropped away
+    exam = EXAMS[-1]
+    x = exam.total.astype(float)
+    composite, whole = decoded(charts.render_png(exam, x, kind)), decoded(charts.draw_png(exam, x, kind))
+    assert composite.shape == whole.shape
+    # palette quantization and antialiasing, not missing artists
+    assert (np.abs(composite - whole).max(axis=-1) > 16).mean() < 0.005
+
+
+def jobs(n=50):
+    # a mix of every chart kind over every exam, with different scores
+    rng = np.random.default_rng(0)
+    for i in range(n):
+        exam = EXAMS[i % len(EXAMS)]
+        kind, options = KINDS[i % len(KINDS)]
+        x = None if kind in render.STATIC_CHARTS else rng.integers(40, 100, len(exam.subjects)).astype(float)
+        yield exam, x, kind, options
+
+
+def digest(job):
+    exam, x, kind, options = job
+    return hashlib.sha1(charts.render_png(exam, x, kind, **options)).hexdigest()
+
+
+# pytest keeps every captured log record and warning (missing-font notices, one per render), which
+# would show up as growth in the traced memory
+@pytest.mark.filterwarnings('ignore')
+def test_concurrent_renders_match_serial_and_stay_bounded(caplog):
+    caplog.set_level(logging.CRITICAL, logger='matplotlib')
+    work = list(jobs())
+    expected = [digest(job) for job in work]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peaks, live = [], []
+        for _ in range(2):
+            tracemalloc.reset_peak()
+            with ThreadPoolExecutor(len(work)) as pool:
+                assert list(pool.map(digest, work)) == expected
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak)
+            live.append(current)
+    finally:
+        tracemalloc.stop()
+    # no figure is left in pyplot's registry, and a second round costs no more than the first
+    assert pyplot.get_fignums() == []
+    assert live[1] <= live[0] * 1.1 + 2**20
+    assert peaks[1] <= peaks[0] * 1.1
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from examstats import cli, load_catalog
+
+EXAM = list(load_catalog().values())[-1]
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_roster(path, n):
+    scores = np.round(np.random.default_rng(0).uniform(0.3, 1, (n, len(EXAM.subjects))) * EXAM.total)
+    table = pd.DataFrame(scores, columns=list(EXAM.subjects))
+    table.insert(0, '姓名', [f'学生{i}' for i in range(n)])
+    table.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def roster(tmp_path):
+    return write_roster(tmp_path / 'roster.csv', 500)
+
+
+def test_parallel_output_matches_serial(roster, tmp_path):
+    serial, parallel = tmp_path / 'serial.csv', tmp_path / 'parallel.csv'
+    cli.main(['rank', str(roster), '-o', str(serial), '--chunksize', '40'])
+    cli.main(['rank', str(roster), '-o', str(parallel), '--chunksize', '40', '-j', '2'])
+    assert parallel.read_bytes() == serial.read_bytes()
+    lines = parallel.read_text(encoding='utf-8').splitlines()
+    assert sum(line.startswith('姓名,') for line in lines) == 1
+    assert [line.split(',')[0] for line in lines[1:]] == [f'学生{i}' for i in range(500)]
+
+
+def test_parquet_output_by_extension(roster, tmp_path):
+    pytest.importorskip('pyarrow')
+    csv, parquet = tmp_path / 'ranks.csv', tmp_path / 'ranks.parquet'
+    cli.main(['rank', str(roster), '-o', str(csv), '--chunksize', '40'])
+    cli.main(['rank', str(roster), '-o', str(parquet), '--chunksize', '40', '-j', '2'])
+    assert parquet.read_bytes()[:4] == b'PAR1'
+    pd.testing.assert_frame_equal(pd.read_parquet(parquet), pd.read_csv(csv))
+
+
+def test_closed_stdout_exits_quietly(tmp_path):
+    # chunks of more output than a pipe buffers, so a later chunk is written after the reader has gone
+    roster = write_roster(tmp_path / 'roster.csv', 5000)
+    command = [sys.executable, '-m', 'examstats', 'rank', str(roster), '--chunksize', '500']
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.stdout.readline().startswith('姓名,'.encode())
+    process.stdout.close()
+    stderr = process.stderr.read()
+    process.wait(60)
+    assert process.returncode == 1
+    assert stderr == b''
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from examstats import normal
+
+RNG = np.random.default_rng(0)
+X = RNG.uniform(-50, 200, 10_000)
+MEAN = RNG.uniform(0, 150, 10_000)
+STD = RNG.uniform(1, 40, 10_000)
+
+
+@pytest.mark.parametrize('name', ['cdf', 'pdf'])
+def test_arrays_match_scipy(name):
+    np.testing.assert_allclose(getattr(normal, name)(X, MEAN, STD), getattr(norm, name)(X, MEAN, STD),
+                               rtol=1e-12, atol=1e-300)
+
+
+@pytest.mark.parametrize('name', ['cdf', 'pdf'])
+def test_scalars_match_scipy(name):
+    for x, mean, std in zip(X[:500].tolist(), MEAN[:500].tolist(), STD[:500].tolist()):
+        value = getattr(normal, name)(x, mean, std)
+        assert isinstance(value, float)
+        assert value == pytest.approx(getattr(norm, name)(x, mean, std), rel=1e-12, abs=1e-300)
+
+
+def test_broadcasting_matches_scipy():
+    # the catalog's curve tables: one row of points per subject
+    x = np.linspace(0, 150, 400)
+    mean, std = MEAN[:9, None], STD[:9, None]
+    for name in ('cdf', 'pdf'):
+        result = getattr(normal, name)(x, mean, std)
+        assert result.shape == (9, 400)
+        np.testing.assert_allclose(result, getattr(norm, name)(x, mean, std), rtol=1e-12, atol=1e-300)
+
+
+def test_ppf_matches_scipy():
+    q = np.concatenate([RNG.uniform(0, 1, 10_000), [0.0, 1.0, 1e-12, 1 - 1e-12]])
+    np.testing.assert_allclose(normal.ppf(q, 100.0, 12.5), norm.ppf(q, 100.0, 12.5), rtol=1e-12)
+    np.testing.assert_allclose(normal.ppf(q[:20, None], MEAN[:9], STD[:9]), norm.ppf(q[:20, None], MEAN[:9], STD[:9]),
+                               rtol=1e-12)
+    assert normal.ppf(0.975) == pytest.approx(norm.ppf(0.975), rel=1e-12)
@@ -0,0 +1,78 @@
+import dataclasses
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from examstats import load_catalog, render
+
+EXAM = list(load_catalog().values())[-1]
+X = np.full(len(EXAM.subjects), 60.0)
+
+
+def wait_started(pool):
+    deadline = time.monotonic() + 120
+    while pool.overloaded():
+        assert time.monotonic() < deadline, 'render workers did not start'
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def pool():
+    pool = render.RenderPool(workers=1)
+    wait_started(pool)
+    yield pool
+    pool.close()
+
+
+def test_pool_recovers_from_a_killed_worker(pool):
+    expected = pool.render(EXAM, X, 'waterfall')
+    broken = pool.pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(0.5)
+    # this request is rendered in-process while the workers restart
+    assert pool.render(EXAM, X, 'waterfall') == expected
+    assert pool.pool is not broken
+    assert pool.overloaded()
+    wait_started(pool)
+    assert pool.render(EXAM, X, 'waterfall') == expected
+
+
+def test_render_timeout_restarts_the_workers(pool, monkeypatch):
+    expected = pool.render(EXAM, X, 'subjects')
+    hung = pool.pool
+    workers = list(hung._processes.values())
+    monkeypatch.setattr(render, 'RENDER_TIMEOUT', 0.001)
+    with pytest.raises(render.RenderQueueFull):
+        pool.render(EXAM, X, 'waterfall')
+    assert pool.busy == 0
+    assert pool.pool is not hung
+    for worker in workers:
+        worker.join(10)
+        assert not worker.is_alive()
+    monkeypatch.setattr(render, 'RENDER_TIMEOUT', 30)
+    wait_started(pool)
+    assert pool.render(EXAM, X, 'subjects') == expected
+
+
+def test_full_queue_is_busy_at_once(pool):
+    while pool.slots.acquire(blocking=False):
+        pass
+    started = time.monotonic()
+    with pytest.raises(render.RenderQueueFull):
+        pool.render(EXAM, X, 'subjects')
+    assert time.monotonic() - started < 1
+
+
+def test_stale_catalog_is_rendered_in_process(pool):
+    stale = dataclasses.replace(EXAM, version='stale')
+    assert pool.render(stale, X, 'waterfall') == pool.render(EXAM, X, 'waterfall')
+
+
+def test_chart_errors_are_not_rendered_again(pool, monkeypatch):
+    monkeypatch.setattr(render, 'render_here', None)
+    with pytest.raises(KeyError):
+        pool.render(EXAM, X, 'no-such-chart')
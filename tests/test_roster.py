@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import pytest
+
+from examstats import load_catalog, roster
+
+EXAM = list(load_catalog().values())[-1]
+
+
+def csv(rows, subjects=EXAM.subjects):
+    lines = [','.join(['姓名', '学号', *subjects])]
+    lines += [','.join([name, number, *map(str, scores)]) for name, number, scores in rows]
+    return io.BytesIO('\n'.join(lines).encode())
+
+
+def students(n):
+    return [(f'学生{i}', f'A{i:03d}', [60 + i] * len(EXAM.subjects)) for i in range(n)]
+
+
+def test_bad_row_in_a_later_chunk_is_reported_by_its_line():
+    rows = students(8)
+    rows[6][2][0] = -1
+    rows[7][2][1] = ''
+    # line 1 is the header, so students 6 and 7 are on lines 8 and 9, in the third chunk of three
+    chunks = roster.read_roster(EXAM, csv(rows), chunksize=3)
+    assert len(next(chunks)[1]) == len(next(chunks)[1]) == 3
+    with pytest.raises(ValueError, match='第 8, 9 行'):
+        next(chunks)
+
+
+def test_missing_subject_column():
+    with pytest.raises(ValueError, match=EXAM.subjects[-1]):
+        roster.roster_report(EXAM, csv([(n, i, s[:-1]) for n, i, s in students(2)], EXAM.subjects[:-1]))
+
+
+def test_other_columns_are_carried_through():
+    rows = students(7)
+    report = roster.roster_report(EXAM, csv(rows), chunksize=3)
+    assert list(report.columns[:2]) == ['姓名', '学号']
+    assert report['姓名'].tolist() == [name for name, _, _ in rows]
+    assert report['学号'].tolist() == [number for _, number, _ in rows]
+    np.testing.assert_array_equal(report[list(EXAM.subjects)].to_numpy(), [scores for _, _, scores in rows])
+
+
+def test_summarize_counts_every_student():
+    summary = roster.summarize(EXAM, roster.roster_report(EXAM, csv(students(7)), chunksize=3))
+    assert summary.loc[EXAM.subjects[0], '人数'] == 7
+    assert summary.loc[EXAM.subjects[0], '平均分'] == 63
+
+
+def test_parse_row_accepts_full_width_separators():
+    values = [float(80 + i) for i in range(len(EXAM.subjects))]
+    separators = ['，', '；', '、', '　', '\t', ', ']
+    text = ''.join(f'{v:g}{separators[i % len(separators)]}' for i, v in enumerate(values))
+    assert roster.parse_row(EXAM, text) == dict(zip(EXAM.subjects, values))
+
+
+def test_parse_row_rejects_a_wrong_count():
+    with pytest.raises(ValueError, match=f'需要 {len(EXAM.subjects)} 科'):
+        roster.parse_row(EXAM, '80 90')